@@ -3,15 +3,23 @@ Expose Whatsminer to HA
 """
 from __future__ import annotations
 
+import ipaddress
 import logging
 
+import voluptuous as vol
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import Platform
 from homeassistant.core import HomeAssistant
+import homeassistant.helpers.config_validation as cv
 
 from .api import WhatsminerMachine
-from .const import DOMAIN, COORDINATOR, MINER
+from .const import (
+    DOMAIN, COORDINATOR, MINER, FLEET, CONF_FLEET_MODE, CONF_DISCOVERY, CONF_NETWORKS,
+    CONF_CONNECTIONS, CONF_TIMEOUT, CONF_SCAN_INTERVAL, SCAN_CONNECTIONS, SCAN_TIMEOUT
+)
 from .coordinator import WhatsminerCoordinator
+from .discovery import async_setup_discovery
+from .fleet import WhatsminerFleetCoordinator
 
 # Added Platform.BUTTON to the PLATFORMS list
 PLATFORMS = [Platform.SENSOR, Platform.SWITCH, Platform.BUTTON]
@@ -19,25 +27,88 @@ PLATFORMS = [Platform.SENSOR, Platform.SWITCH, Platform.BUTTON]
 _LOGGER = logging.getLogger(__name__)
 
 
+def _network(value) -> str:
+    try:
+        return str(ipaddress.ip_network(cv.string(value), strict=False))
+    except ValueError as error:
+        raise vol.Invalid(f"Invalid network {value!r}, expected e.g. 192.168.1.0/24") from error
+
+
+DISCOVERY_SCHEMA = vol.Schema({
+    vol.Required(CONF_NETWORKS): vol.All(cv.ensure_list, [_network]),
+    vol.Optional(CONF_CONNECTIONS, default=SCAN_CONNECTIONS): vol.All(
+        int, vol.Range(min=1, max=1024)
+    ),
+    vol.Optional(CONF_TIMEOUT, default=SCAN_TIMEOUT): vol.All(
+        vol.Coerce(float), vol.Range(min=0.1, max=30)
+    ),
+    vol.Optional(CONF_SCAN_INTERVAL, default=3600): vol.All(int, vol.Range(min=60)),
+})
+
+CONFIG_SCHEMA = vol.Schema(
+    {DOMAIN: vol.Schema({vol.Optional(CONF_DISCOVERY): DISCOVERY_SCHEMA})},
+    extra=vol.ALLOW_EXTRA,
+)
+
+
 async def async_setup(hass, config):
+    # Created outside of any config entry so it outlives the entries it polls
+    fleet = WhatsminerFleetCoordinator(hass)
+    await fleet.async_register_shutdown()
+    hass.data.setdefault(DOMAIN, {})[FLEET] = fleet
+    discovery = config.get(DOMAIN, {}).get(CONF_DISCOVERY)
+    if discovery is not None:
+        async_setup_discovery(hass, discovery)
     return True
 
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
-    miner_coordinator = WhatsminerCoordinator(hass, entry)
-    await miner_coordinator.async_refresh()
+    fleet: WhatsminerFleetCoordinator = hass.data[DOMAIN][FLEET]
+    miner_coordinator = WhatsminerCoordinator(
+        hass, entry, fleet if entry.options.get(CONF_FLEET_MODE) else None
+    )
+    entry.async_on_unload(entry.add_update_listener(async_reload_entry))
+    # Once a switch or button needed a token, keep it ready for the next one
+    miner_coordinator.machine.tokens.start()
+    entry.async_on_unload(miner_coordinator.machine.tokens.stop)
     hass.data.setdefault(DOMAIN, {}).setdefault(entry.entry_id, {})[
         COORDINATOR
     ] = miner_coordinator
+    if miner_coordinator.fleet is not None:
+        fleet.async_register(miner_coordinator)
 
-    result = True
-    for platform in PLATFORMS:
-        result = result & await hass.config_entries.async_forward_entry_setup(entry=entry, domain=platform)
-    return result
+    await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    # The enabled entities subscribed to what they read, poll only that from now on
+    miner_coordinator.async_enable_lazy_polling()
+    # Entities start unavailable, a miner that is off must not hold up starting HA
+    entry.async_create_background_task(
+        hass, miner_coordinator.async_refresh(), f"{DOMAIN} first refresh {entry.title}"
+    )
+    return True
+
+
+async def async_migrate_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
+    """Version 1 kept fleet mode in the data, where it could not be changed."""
+    if entry.version == 1:
+        data = dict(entry.data)
+        options = {**entry.options, CONF_FLEET_MODE: data.pop(CONF_FLEET_MODE, False)}
+        entry.version = 2
+        hass.config_entries.async_update_entry(entry, data=data, options=options)
+    return True
 
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     if unload_ok:
+        hass.data[DOMAIN][FLEET].async_unregister(entry.entry_id)
         hass.data[DOMAIN].pop(entry.entry_id)
     return unload_ok
+
+
+async def async_reload_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Options such as the aggregation window are applied by setting up again."""
+    coordinator: WhatsminerCoordinator = hass.data[DOMAIN][entry.entry_id][COORDINATOR]
+    # Also called when the coordinator stores what it detected, which needs no reload
+    if coordinator.options == dict(entry.options):
+        return
+    await hass.config_entries.async_reload(entry.entry_id)
@@ -0,0 +1,104 @@
+"""
+Downsample readings before they reach the recorder
+"""
+from __future__ import annotations
+
+import dataclasses
+import math
+from array import array
+from typing import Any, Callable, Dict, Optional, TYPE_CHECKING
+
+from homeassistant.core import callback, CALLBACK_TYPE
+
+if TYPE_CHECKING:
+    from .coordinator import OnlineMinerData
+
+
+class RingBuffer(object):
+    """The last size samples of a metric, in preallocated storage."""
+
+    def __init__(self, size: int):
+        self._samples = array("d", [math.nan]) * size
+        self._next = 0
+        self.count = 0
+
+    def add(self, value: float) -> None:
+        self._samples[self._next] = value
+        self._next = (self._next + 1) % len(self._samples)
+        self.count = min(self.count + 1, len(self._samples))
+
+    def clear(self) -> None:
+        self._next = 0
+        self.count = 0
+
+    def stats(self) -> Optional[WindowStats]:
+        if not self.count:
+            return None
+        samples = self._samples if self.count == len(self._samples) else self._samples[:self.count]
+        return WindowStats(
+            minimum=min(samples),
+            mean=sum(samples) / self.count,
+            maximum=max(samples),
+            samples=self.count,
+        )
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class WindowStats(object):
+    minimum: float
+    mean: float
+    maximum: float
+    samples: int
+
+
+class Aggregator(object):
+    """
+    Collects every poll of the tracked metrics and publishes their minimum, mean
+    and maximum once per window, so entities write one state per window instead
+    of one per poll while the coordinator keeps polling at full rate.
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        self.published: Dict[str, WindowStats] = {}
+        self._metrics: Dict[str, Callable[[OnlineMinerData], Any]] = {}
+        self._buffers: Dict[str, RingBuffer] = {}
+        self._polls = 0
+
+    @callback
+    def async_track(
+            self, key: str, value: Callable[[OnlineMinerData], Any]
+    ) -> CALLBACK_TYPE:
+        self._metrics[key] = value
+        self._buffers[key] = RingBuffer(self.window)
+
+        @callback
+        def untrack() -> None:
+            self._metrics.pop(key, None)
+            self._buffers.pop(key, None)
+            self.published.pop(key, None)
+
+        return untrack
+
+    def add(self, data: OnlineMinerData) -> None:
+        for key, value in self._metrics.items():
+            sample = value(data)
+            if sample is not None:
+                self._buffers[key].add(sample)
+        self._polls += 1
+        if self._polls >= self.window:
+            self._polls = 0
+            published = {}
+            for key, buffer in self._buffers.items():
+                stats = buffer.stats()
+                if stats is not None:
+                    published[key] = stats
+                buffer.clear()
+            self.published = published
+
+    def reset(self) -> None:
+        """Drops every sample and window, e.g. once the miner went offline."""
+        self._polls = 0
+        self.published = {}
+        for buffer in self._buffers.values():
+            buffer.clear()
@@ -5,20 +5,42 @@ https://aws-microbt-com-bucket.s3.us-west-2.amazonaws.com/WhatsminerAPI%20V2.0.4
 import asyncio
 import base64
 import binascii
+import bisect
+import collections
 import dataclasses
-import datetime
 import hashlib
+import importlib
 import json
 import logging
+import random
 import re
+import time
+import warnings
 from base64 import b64decode
-from typing import Any, Dict, Optional, List, cast
+from typing import (
+    Any, Awaitable, Callable, Dict, Hashable, Optional, List, Sequence, Tuple, Union, cast
+)
 
 from Crypto.Cipher import AES
 from passlib.hash import md5_crypt
 
 logger = logging.getLogger(__name__)
 
+# Tokens are valid for 30 minutes, renew them in the background well before.
+# The renewals of many miners are spread over the jitter instead of all coming
+# due at the same time
+TOKEN_VALIDITY = 29 * 60
+TOKEN_REFRESH_MARGIN = 4 * 60
+TOKEN_REFRESH_JITTER = 2 * 60
+# Failed renewals are retried after 1, 2, 4, ... minutes, up to a token's validity
+TOKEN_RETRY_DELAY = 60
+
+CONNECT_TIMEOUT = 3
+READ_TIMEOUT = 10
+# Unreachable miners are retried after 5s, 10s, 20s, ... up to 5 minutes
+BACKOFF_INITIAL = 5
+BACKOFF_MAX = 5 * 60
+
 
 class WhatsminerException(BaseException):
     pass
@@ -90,26 +112,366 @@ def _check_response(message, response):
         raise InvalidResponse(response)
 
 
+def _load_orjson() -> Optional[Callable[[bytes], Any]]:
+    """orjson ships with Home Assistant, elsewhere the standard library is used."""
+    try:
+        return importlib.import_module("orjson").loads
+    except ImportError:
+        return None
+
+
+JSON_BACKENDS: Dict[str, Callable[[bytes], Any]] = {"json": json.loads}
+_orjson_loads = _load_orjson()
+if _orjson_loads is not None:
+    JSON_BACKENDS["orjson"] = _orjson_loads
+_json_loads = JSON_BACKENDS.get("orjson", json.loads)
+
+
+def _parse_json(payload: bytes) -> Any:
+    try:
+        return _json_loads(payload)
+    except ValueError:
+        # Some firmware closes objects after a trailing comma, only those replies
+        # are copied to be fixed up
+        if b",}" not in payload:
+            raise
+        return _json_loads(payload.replace(b",}", b"}"))
+
+
+def _decode_response(response: bytes) -> Dict:
+    if not response:
+        raise ConnectionResetError("Connection closed without a reply")
+    if response.startswith(b"Socket connect failed: Connection refused"):
+        raise MinerOffline()
+    try:
+        return _parse_json(response)
+    except ValueError as error:
+        raise ValueError(f"Failed to parse response {response!r}") from error
+
+
+def _split_batch_response(
+        message, cmds, response
+) -> Dict[str, Union[Dict, BaseException]]:
+    if not all(isinstance(response.get(cmd), (list, dict)) for cmd in cmds):
+        _check_response(message, response)
+        raise InvalidResponse(response)
+    responses = {}
+    for cmd in cmds:
+        # cgminer wraps every part of a joined reply in a single element list
+        part = response[cmd]
+        if isinstance(part, list):
+            if not part:
+                raise InvalidResponse(response)
+            part = part[0]
+        try:
+            _check_response(cmd, part)
+            responses[cmd] = part
+        except WhatsminerException as error:
+            responses[cmd] = error
+    return responses
+
+
+class SingleFlight(object):
+    """
+    Merges concurrent calls with the same key into one in-flight call whose
+    result, or exception, is shared by every caller.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self._waiters: Dict[asyncio.Future, int] = {}
+
+    def start(
+            self,
+            key: Hashable,
+            factory: Callable[[], Awaitable[Any]],
+            done_callback: Optional[Callable[[asyncio.Future], None]] = None,
+    ) -> asyncio.Future:
+        """Joins the call in flight for key, or starts it. done_callback is only
+        attached to a newly started call."""
+        call = self._calls.get(key)
+        if call is None:
+            call = asyncio.ensure_future(factory())
+            self._calls[key] = call
+            call.add_done_callback(lambda finished: self._forget(key, finished))
+            if done_callback is not None:
+                call.add_done_callback(done_callback)
+        return call
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        call = self.start(key, factory)
+        self._waiters[call] = self._waiters.get(call, 0) + 1
+        try:
+            # Shielded so one caller being cancelled does not abort the shared call
+            return await asyncio.shield(call)
+        finally:
+            self._waiters[call] -= 1
+            if not self._waiters[call]:
+                del self._waiters[call]
+                # Nobody is left to use the result, do not let a hung call linger
+                if not call.done():
+                    call.cancel()
+                    if self._calls.get(key) is call:
+                        del self._calls[key]
+
+    def _forget(self, key: Hashable, call: asyncio.Future) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        # Every caller may have been cancelled, do not warn about a lost exception
+        if not call.cancelled():
+            call.exception()
+
+
+class CircuitBreaker(object):
+    """
+    Fails requests to an unreachable miner fast instead of opening a socket.
+    Every connection failure opens the circuit for a jittered, exponentially
+    growing delay. Once that passed, a single request is let through as the
+    probe (half open), while concurrent ones keep failing fast, and whether it
+    connects closes or reopens the circuit.
+    """
+
+    def __init__(self, initial: float = BACKOFF_INITIAL, maximum: float = BACKOFF_MAX):
+        self._initial = initial
+        self._maximum = maximum
+        self.failures = 0
+        self.open_until = 0.0
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if not self.failures:
+            return "closed"
+        return "half_open" if self._probing else "open"
+
+    def allow(self, now: float) -> bool:
+        if not self.failures:
+            return True
+        if self._probing or now < self.open_until:
+            return False
+        self._probing = True
+        return True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self, now: float) -> None:
+        if self.failures and not self._probing:
+            # Already open, a request sent before it opened failed as well
+            return
+        self.failures += 1
+        self._probing = False
+        delay = min(self._maximum, self._initial * 2 ** (self.failures - 1))
+        self.open_until = now + random.uniform(delay / 2, delay)
+
+    def release_probe(self) -> None:
+        """The probe was cancelled before it connected, let the next request probe."""
+        self._probing = False
+
+
+class Histogram(object):
+    """
+    Counts samples in fixed buckets, so memory stays the same however long a
+    miner is polled. Percentiles are the upper bound of their bucket.
+    """
+
+    BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+    def __init__(self):
+        self.buckets = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def add(self, value: float) -> None:
+        self.buckets[bisect.bisect_left(self.BOUNDS, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.maximum:
+            self.maximum = value
+
+    def merge(self, other: "Histogram") -> None:
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+        self.count += other.count
+        self.total += other.total
+        self.maximum = max(self.maximum, other.maximum)
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    def percentile(self, percent: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = percent / 100 * self.count
+        seen = 0
+        for bound, count in zip(self.BOUNDS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.maximum)
+        return self.maximum
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.maximum,
+            "buckets": dict(zip([*map(str, self.BOUNDS), "inf"], self.buckets)),
+        }
+
+
+class CommandStats(object):
+    """Timings in milliseconds, and traffic and errors of one command."""
+
+    def __init__(self):
+        self.requests = 0
+        self.connect = Histogram()
+        self.round_trip = Histogram()
+        # Parsing and decryption, for get_token the key derivation
+        self.decode = Histogram()
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.errors: Dict[str, int] = collections.Counter()
+
+    def merge(self, other: "CommandStats") -> None:
+        self.requests += other.requests
+        self.connect.merge(other.connect)
+        self.round_trip.merge(other.round_trip)
+        self.decode.merge(other.decode)
+        self.bytes_out += other.bytes_out
+        self.bytes_in += other.bytes_in
+        self.errors.update(other.errors)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "connect_ms": self.connect.as_dict(),
+            "round_trip_ms": self.round_trip.as_dict(),
+            "decode_ms": self.decode.as_dict(),
+            "bytes_out": self.bytes_out,
+            "bytes_in": self.bytes_in,
+            "errors": dict(self.errors),
+        }
+
+
+class MachineStats(object):
+    """
+    Per command statistics of a machine. Joined reads are kept under the joined
+    command, e.g. "status+summary".
+    """
+
+    def __init__(self):
+        self.commands: Dict[str, CommandStats] = {}
+
+    def command(self, name: str) -> CommandStats:
+        stats = self.commands.get(name)
+        if stats is None:
+            stats = self.commands[name] = CommandStats()
+        return stats
+
+    def record_error(self, name: str, error: BaseException) -> None:
+        self.command(name).errors[type(error).__name__] += 1
+
+    def total(self) -> CommandStats:
+        total = CommandStats()
+        for stats in self.commands.values():
+            total.merge(stats)
+        return total
+
+    def slowest(self) -> Optional[str]:
+        """The command with the highest 95th percentile round trip."""
+        timed = [
+            (stats.round_trip.percentile(95), name)
+            for name, stats in self.commands.items()
+            if stats.round_trip.count
+        ]
+        return max(timed)[1] if timed else None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {name: stats.as_dict() for name, stats in self.commands.items()}
+
+
 class WhatsminerMachine(object):
-    def __init__(self, host: str, port: int = 4028, admin_password: str = None):
+    def __init__(
+            self,
+            host: str,
+            port: int = 4028,
+            admin_password: str = None,
+            connection_limiter: Optional[asyncio.Semaphore] = None,
+    ):
         self.host = host
         self.port = port
         self._admin_password = admin_password
-        self._token = None
-        self._token_time = None
-        self._cipher = None
+        # Shared between machines of a fleet to bound the number of open sockets
+        self.connection_limiter = connection_limiter
+        self.tokens = TokenManager(self)
+        self.breaker = CircuitBreaker()
+        self.stats = MachineStats()
+        # Identical reads issued at the same time share one connection
+        self._in_flight = SingleFlight()
+        # None until the first joined request tells whether the firmware accepts them
+        self._batch_supported: Optional[bool] = None
 
     async def _communicate_raw(
-            self, data: str, expect_response: bool = True
-    ) -> Optional[str]:
-        r, w = await asyncio.open_connection(host=self.host, port=self.port)
-        logger.debug("Writing message %s", data)
-        w.write(data.encode("utf-8"))
+            self, data: str, command: str, expect_response: bool = True
+    ) -> Optional[bytes]:
+        if not self.breaker.allow(time.monotonic()):
+            raise MinerOffline()
+        stats = self.stats.command(command)
+        stats.requests += 1
+        try:
+            if self.connection_limiter is None:
+                return await self._exchange(data, expect_response, stats)
+            async with self.connection_limiter:
+                return await self._exchange(data, expect_response, stats)
+        except asyncio.CancelledError:
+            self.breaker.release_probe()
+            raise
+
+    async def _connect(self):
+        try:
+            connection = await asyncio.wait_for(
+                asyncio.open_connection(host=self.host, port=self.port), CONNECT_TIMEOUT
+            )
+        except (OSError, asyncio.TimeoutError) as error:
+            self.breaker.record_failure(time.monotonic())
+            logger.debug(
+                "Cannot connect to %s, retrying in %.0fs: %r",
+                self.host, self.breaker.open_until - time.monotonic(), error,
+            )
+            raise MinerOffline() from error
+        self.breaker.record_success()
+        return connection
+
+    async def _exchange(
+            self, data: str, expect_response: bool, stats: CommandStats
+    ) -> Optional[bytes]:
+        # Timed whether they succeed or not: connects and reads that time out or
+        # are cancelled by the poll deadline are the slow miners to find
+        started = time.perf_counter()
         try:
+            r, w = await self._connect()
+        finally:
+            connected = time.perf_counter()
+            stats.connect.add((connected - started) * 1000)
+        try:
+            logger.debug("Writing message %s", data)
+            payload = data.encode("utf-8")
+            w.write(payload)
+            stats.bytes_out += len(payload)
             if expect_response:
-                response = (await r.readline()).decode("utf-8").strip()
+                try:
+                    response = await asyncio.wait_for(r.readline(), READ_TIMEOUT)
+                finally:
+                    stats.round_trip.add((time.perf_counter() - connected) * 1000)
+                stats.bytes_in += len(response)
                 logger.debug("Received response %s", response)
-                return response.replace(",}", "}")
+                # Left as bytes, the JSON parsers read them directly
+                return response
         finally:
             w.close()
 
@@ -119,6 +481,20 @@ class WhatsminerMachine(object):
             additional: Optional[Dict[str, Any]] = None,
             encrypted=False,
             expect_response=True,
+    ) -> Optional[Dict]:
+        try:
+            return await self._communicate(cmd, additional, encrypted, expect_response)
+        except (WhatsminerException, OSError, asyncio.TimeoutError, ValueError) as error:
+            self.stats.record_error(cmd, error)
+            raise
+
+    async def _communicate(
+            self,
+            cmd: str,
+            additional: Optional[Dict[str, Any]],
+            encrypted: bool,
+            expect_response: bool,
+            retry: bool = True,
     ) -> Optional[Dict]:
         if additional:
             data = dict(additional)
@@ -126,12 +502,15 @@ class WhatsminerMachine(object):
             data = {}
         data["cmd"] = cmd
         if encrypted:
-            data["token"] = await self._get_token()
+            # Token and cipher must come from the same refresh
+            credentials = await self.tokens.get()
+            cipher = credentials.cipher
+            data["token"] = credentials.token
 
         plain_message = json.dumps(data)
         if encrypted:
             enc_str = (
-                base64.encodebytes(self._cipher.encrypt(pad(plain_message)))
+                base64.encodebytes(cipher.encrypt(pad(plain_message)))
                     .decode("utf-8")
                     .replace("\n", "")
             )
@@ -139,29 +518,43 @@ class WhatsminerMachine(object):
         else:
             message = plain_message
 
-        response = await self._communicate_raw(message, expect_response)
-        if not expect_response:
-            return None
+        if encrypted or not expect_response:
+            response = await self._communicate_raw(message, cmd, expect_response)
+            if not expect_response:
+                return None
+        else:
+            response = await self._in_flight.run(
+                message, lambda: self._communicate_raw(message, cmd)
+            )
 
-        if response.strip() == "Socket connect failed: Connection refused":
-            raise MinerOffline()
+        started = time.perf_counter()
         try:
-            json_response = json.loads(response)
-        except json.JSONDecodeError as error:
-            raise ValueError(f"Failed to parse response {response}") from error
+            return self._decode(message, plain_message, response, cipher if encrypted else None)
+        except TokenError:
+            if not encrypted or not retry:
+                raise
+        finally:
+            self.stats.command(cmd).decode.add((time.perf_counter() - started) * 1000)
 
-        if encrypted:
+        # The miner dropped the token before it expired, e.g. because it restarted
+        logger.debug("Token for %s rejected, requesting a new one", self.host)
+        self.tokens.invalidate(credentials)
+        return await self._communicate(cmd, additional, encrypted, expect_response, retry=False)
+
+    @staticmethod
+    def _decode(message: str, plain_message: str, response: bytes, cipher) -> Dict:
+        json_response = _decode_response(response)
+
+        if cipher is not None:
             if json_response.get("Code", 0) == 23:
                 raise InvalidAuth()
             try:
-                resp_plaintext: str = (
-                    self._cipher.decrypt(b64decode(json_response["enc"]))
-                        .decode("utf-8")
-                        .rstrip("\0\n ")
+                resp_plaintext: bytes = (
+                    cipher.decrypt(b64decode(json_response["enc"])).rstrip(b"\0\n ")
                 )
                 if not resp_plaintext:
                     raise InvalidResponse()
-                plain_response = json.loads(resp_plaintext)
+                plain_response = _parse_json(resp_plaintext)
                 _check_response(plain_message, plain_response)
                 return plain_response
             except KeyError:
@@ -170,7 +563,68 @@ class WhatsminerMachine(object):
         _check_response(message, json_response)
         return json_response
 
+    async def communicate_batch(
+            self, cmds: Sequence[str], timeout: Optional[float] = None
+    ) -> Dict[str, Union[Dict, BaseException]]:
+        """
+        Sends several unencrypted read commands in one request, joined cgminer
+        style as "summary+devdetails", and splits the reply per command. When the
+        firmware rejects joined commands, this is remembered and the commands are
+        sent as separate concurrent requests instead.
+
+        Like asyncio.gather with return_exceptions, a failed command maps to its
+        exception instead of its response. Commands still unanswered after timeout
+        seconds map to asyncio.TimeoutError, the others keep their replies.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+
+        if len(cmds) > 1 and self._batch_supported is not False:
+            joined = "+".join(cmds)
+            message = json.dumps({"cmd": joined})
+            try:
+                response = await asyncio.wait_for(
+                    self._in_flight.run(message, lambda: self._communicate_raw(message, joined)),
+                    timeout,
+                )
+                started = time.perf_counter()
+                try:
+                    responses = _split_batch_response(message, cmds, _decode_response(response))
+                finally:
+                    self.stats.command(joined).decode.add((time.perf_counter() - started) * 1000)
+            except (InvalidCommand, InvalidMessage, InvalidResponse, ValueError) as error:
+                logger.debug("Joined commands rejected by %s: %r", self.host, error)
+                self.stats.record_error(joined, error)
+                self._batch_supported = False
+            except (WhatsminerException, OSError, asyncio.TimeoutError) as error:
+                self.stats.record_error(joined, error)
+                return {cmd: error for cmd in cmds}
+            else:
+                self._batch_supported = True
+                for cmd, part in responses.items():
+                    if isinstance(part, BaseException):
+                        self.stats.record_error(cmd, part)
+                return responses
+
+        calls = {cmd: asyncio.ensure_future(self.communicate(cmd)) for cmd in cmds}
+        _, pending = await asyncio.wait(
+            calls.values(), timeout=None if deadline is None else max(deadline - loop.time(), 0)
+        )
+        for call in pending:
+            call.cancel()
+        return {
+            cmd: asyncio.TimeoutError()
+            if call in pending or call.cancelled()
+            else call.exception() or call.result()
+            for cmd, call in calls.items()
+        }
+
     async def _get_token(self) -> str:
+        return (await self.tokens.get()).token
+
+    async def _request_credentials(
+            self, previous: Optional["Credentials"] = None
+    ) -> "Credentials":
         """
         Encryption algorithm:
         Ciphertext = aes256(plaintext)，ECB mode
@@ -183,35 +637,147 @@ class WhatsminerMachine(object):
         Final assembly: enc|base64(aes256("token,sign|set_led|auto", $aes_key))
         """
 
-        now = datetime.datetime.now()
-
-        if (
-                self._token_time is not None
-                and (now - self._token_time).total_seconds() < 29 * 60
-        ):
-            return self._token
-
+        issued = time.monotonic()
         message = json.dumps({"cmd": "get_token"})
-        response = json.loads(await self._communicate_raw(message))
-        _check_response(message, response)
+        try:
+            response = _decode_response(await self._communicate_raw(message, "get_token"))
+            _check_response(message, response)
+
+            token_info = response["Msg"]
+            started = time.perf_counter()
+            # md5-crypt is slow in pure Python, keep it off the event loop
+            credentials = await asyncio.get_running_loop().run_in_executor(
+                None, _derive_credentials, self._admin_password, token_info, issued, previous
+            )
+        except (WhatsminerException, OSError, asyncio.TimeoutError, ValueError) as error:
+            self.stats.record_error("get_token", error)
+            raise
+        self.stats.command("get_token").decode.add((time.perf_counter() - started) * 1000)
+        return credentials
 
-        token_info = response["Msg"]
-        key = crypt(self._admin_password, f"$1${token_info['salt']}$").split("$")[3]
-        self._cipher = AES.new(
+    async def check(self):
+        """
+        Verifies the password. The key is derived locally, so a token alone does
+        not prove it: an encrypted command has to be decrypted by the miner, which
+        answers a message encrypted with the wrong key with InvalidAuth.
+        """
+        await self.tokens.refresh()
+        try:
+            await self.communicate("get_miner_info", {"info": "mac"}, encrypted=True)
+        except InvalidCommand:
+            # Decrypted, but not accepted on the encrypted path by this firmware
+            pass
+
+
+@dataclasses.dataclass(frozen=True)
+class Credentials(object):
+    token: str
+    cipher: Any
+    issued: float
+    # The key and cipher only change with the salt, kept for the next token
+    salt: str
+    key: str = dataclasses.field(repr=False)
+
+
+def _derive_credentials(
+        password: str,
+        token_info: Dict[str, str],
+        issued: float,
+        previous: Optional[Credentials] = None,
+) -> Credentials:
+    salt = token_info["salt"]
+    # The salt stays the same between tokens, only the second step changes
+    if previous is not None and previous.salt == salt:
+        key, cipher = previous.key, previous.cipher
+    else:
+        key = _derive_key(password, salt)
+        cipher = AES.new(
             binascii.unhexlify(hashlib.sha256(key.encode()).hexdigest().encode()),
             AES.MODE_ECB,
         )
-        self._token = crypt(
-            key + token_info["time"], f"$1${token_info['newsalt']}$"
-        ).split("$")[3]
-        self._token_time = now
-        return self._token
+    token = crypt(key + token_info["time"], f"$1${token_info['newsalt']}$").split("$")[3]
+    return Credentials(token=token, cipher=cipher, issued=issued, salt=salt, key=key)
 
-    async def check(self):
-        await self._get_token()
+
+class TokenManager(object):
+    """
+    Keeps the token and AES cipher of a machine valid. Refreshes are single
+    flight: concurrent callers share one get_token request, so no token is
+    wasted towards the TokenExceeded limit. The first encrypted command
+    fetches the token, once started it is then renewed in the background
+    ahead of its expiry, so later commands do not wait for authentication.
+    """
+
+    def __init__(self, machine: WhatsminerMachine):
+        self._machine = machine
+        self._credentials: Optional[Credentials] = None
+        self._refresh = SingleFlight()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running = False
+        self._failures = 0
+
+    async def get(self) -> Credentials:
+        credentials = self._credentials
+        if credentials is not None and time.monotonic() - credentials.issued < TOKEN_VALIDITY:
+            return credentials
+        return await self.refresh()
+
+    async def refresh(self) -> Credentials:
+        # Shielded so a caller timing out does not abort the shared refresh
+        return await asyncio.shield(self._start_refresh())
+
+    def start(self) -> None:
+        """
+        Keeps the token fresh until stopped, from the first time it is needed
+        on. Miners that only get read never request one.
+        """
+        self._running = True
+
+    def invalidate(self, credentials: Credentials) -> None:
+        """
+        Expires credentials the miner rejected, unless already replaced. Their
+        key stays in use for the next token.
+        """
+        if self._credentials is credentials:
+            self._credentials = dataclasses.replace(credentials, issued=-TOKEN_VALIDITY)
+
+    def stop(self) -> None:
+        self._running = False
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _start_refresh(self) -> asyncio.Future:
+        return self._refresh.start(
+            "get_token",
+            lambda: self._machine._request_credentials(self._credentials),
+            self._refresh_done,
+        )
+
+    def _refresh_done(self, refresh: asyncio.Future) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        error = None if refresh.cancelled() else refresh.exception()
+        if refresh.cancelled() or error is not None:
+            logger.debug("Token refresh for %s failed: %r", self._machine.host, error)
+            if isinstance(error, (ApiPermissionDenied, InvalidAuth)):
+                # Retrying cannot help, the next encrypted command asks again
+                return
+            # Backs off further on every failure, TokenExceeded in particular only
+            # clears once earlier tokens expired
+            delay = min(TOKEN_RETRY_DELAY * 2 ** self._failures, TOKEN_VALIDITY)
+            self._failures += 1
+        else:
+            self._credentials = refresh.result()
+            self._failures = 0
+            delay = TOKEN_VALIDITY - TOKEN_REFRESH_MARGIN - random.uniform(0, TOKEN_REFRESH_JITTER)
+
+        if self._running:
+            self._timer = asyncio.get_running_loop().call_later(delay, self._start_refresh)
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(frozen=True, slots=True)
 class Summary(object):
     elapsed: int
     average_hash_rate: float
@@ -246,7 +812,65 @@ class Summary(object):
     mac: str
 
 
-@dataclasses.dataclass
+def _ghs(value: float) -> float:
+    # MH/s in the reply, GH/s in Summary
+    return value / 1000
+
+
+def _rounded_ghs(value: float) -> int:
+    return round(value / 1000)
+
+
+def _security_mode(value: int) -> bool:
+    return value == 0
+
+
+# Summary attribute, reply key and conversion (None keeps the value) of every
+# field read from a summary reply
+SummaryFields = Tuple[Tuple[str, str, Optional[Callable[[Any], Any]]], ...]
+
+SUMMARY_FIELDS: SummaryFields = (
+    ("elapsed", "Elapsed", None),
+    ("average_hash_rate", "MHS av", _rounded_ghs),
+    ("hash_rate_5s", "MHS 5s", _rounded_ghs),
+    ("hash_rate_1m", "MHS 1m", _rounded_ghs),
+    ("hash_rate_5m", "MHS 5m", _rounded_ghs),
+    ("hash_rate_15m", "MHS 15m", _rounded_ghs),
+    ("average_frequency", "freq_avg", None),
+    ("target_frequency", "Target Freq", None),
+    ("target_hash_rate", "Target MHS", _ghs),
+    ("accepted", "Accepted", None),
+    ("rejected", "Rejected", None),
+    ("temperature", "Temperature", None),
+    ("chip_temperature_minimum", "Chip Temp Min", None),
+    ("chip_temperature_maximum", "Chip Temp Max", None),
+    ("chip_temperature_average", "Chip Temp Avg", None),
+    ("environment_temperature", "Env Temp", None),
+    ("fan_speed_in", "Fan Speed In", None),
+    ("fan_speed_out", "Fan Speed Out", None),
+    ("power", "Power", None),
+    ("power_rate", "Power_RT", None),
+    ("power_mode", "Power Mode", None),
+    ("pool_rejected_percent", "Pool Rejected%", None),
+    ("pool_stale_percent", "Pool Stale%", None),
+    ("uptime", "Uptime", None),
+    ("security_mode", "Security Mode", _security_mode),
+    ("mac", "MAC", None),
+)
+
+
+def build_summary(fields: SummaryFields, data: Dict, **values: Any) -> Summary:
+    """
+    Builds a Summary from the SUMMARY part of a reply. Fields not in the reply
+    are passed as values. Raises KeyError when the reply lacks a key of fields.
+    """
+    for attribute, key, convert in fields:
+        value = data[key]
+        values[attribute] = value if convert is None else convert(value)
+    return Summary(**values)
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
 class DeviceDetails(object):
     index: int
     name: str
@@ -256,7 +880,7 @@ class DeviceDetails(object):
     model: str
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(frozen=True, slots=True)
 class PowerUnitDetails(object):
     name: str
     hardware_version: str
@@ -269,7 +893,7 @@ class PowerUnitDetails(object):
     # serial_number: str
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(frozen=True, slots=True)
 class Version(object):
     api_version: str
     firmware_version: str
@@ -286,20 +910,49 @@ class Version(object):
 #     mac: str
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(frozen=True, slots=True)
 class MinerStatus(object):
     miner_online: bool
     firmware_version: str
 
 
 class WhatsminerApi(object):
+    _summary_fields = SUMMARY_FIELDS
+
     def __init__(self, machine: WhatsminerMachine):
         self.machine = machine
 
+    async def read(self, *commands: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Fetches and parses several read commands, batched into a single request
+        when the firmware allows it. A command that failed, or did not answer
+        within timeout seconds, maps to its exception.
+        """
+        responses = await self._fetch(commands, timeout)
+        readings = {}
+        for command in commands:
+            response = responses[command]
+            if isinstance(response, BaseException):
+                readings[command] = response
+                continue
+            try:
+                readings[command] = getattr(self, _PARSERS[command])(response)
+            except WhatsminerException as error:
+                readings[command] = error
+        return readings
+
+    async def _fetch(
+            self, commands: Sequence[str], timeout: Optional[float]
+    ) -> Dict[str, Union[Dict, BaseException]]:
+        return await self.machine.communicate_batch(commands, timeout)
+
     async def get_device_details(self) -> List[DeviceDetails]:
         response = await self.machine.communicate(
             "devdetails", encrypted=False, expect_response=True
         )
+        return self._parse_device_details(response)
+
+    def _parse_device_details(self, response: Dict) -> List[DeviceDetails]:
         try:
             return [
                 DeviceDetails(
@@ -319,43 +972,21 @@ class WhatsminerApi(object):
         response = await self.machine.communicate(
             "summary", encrypted=False, expect_response=True
         )
+        return self._parse_summary(response)
+
+    def _parse_summary(self, response: Dict) -> Summary:
         try:
-            data = response["SUMMARY"][0]
-            return Summary(
-                elapsed=data["Elapsed"],
-                average_hash_rate=round(data["MHS av"] / 1000),
-                hash_rate_5s=round(data["MHS 5s"] / 1000),
-                hash_rate_1m=round(data["MHS 1m"] / 1000),
-                hash_rate_5m=round(data["MHS 5m"] / 1000),
-                hash_rate_15m=round(data["MHS 15m"] / 1000),
-                accepted=data["Accepted"],
-                rejected=data["Rejected"],
-                temperature=data["Temperature"],
-                average_frequency=data["freq_avg"],
-                fan_speed_in=data["Fan Speed In"],
-                fan_speed_out=data["Fan Speed Out"],
-                power=data["Power"],
-                power_rate=data["Power_RT"],
-                pool_rejected_percent=data["Pool Rejected%"],
-                pool_stale_percent=data["Pool Stale%"],
-                uptime=data["Uptime"],
-                security_mode=data["Security Mode"] == 0,
-                target_frequency=data["Target Freq"],
-                target_hash_rate=data["Target MHS"] / 1000,
-                environment_temperature=data["Env Temp"],
-                power_mode=data["Power Mode"],
-                chip_temperature_minimum=data["Chip Temp Min"],
-                chip_temperature_maximum=data["Chip Temp Max"],
-                chip_temperature_average=data["Chip Temp Avg"],
-                mac=data["MAC"],
-            )
-        except KeyError as error:
+            return build_summary(self._summary_fields, response["SUMMARY"][0])
+        except (KeyError, IndexError) as error:
             raise InvalidResponse() from error
 
     async def get_psu(self) -> PowerUnitDetails:
         response = await self.machine.communicate(
             "get_psu", encrypted=False, expect_response=True
         )
+        return self._parse_psu(response)
+
+    def _parse_psu(self, response: Dict) -> PowerUnitDetails:
         try:
             data = response["Msg"]
             return PowerUnitDetails(
@@ -376,6 +1007,9 @@ class WhatsminerApi(object):
         response = await self.machine.communicate(
             "get_version", encrypted=False, expect_response=True
         )
+        return self._parse_version(response)
+
+    def _parse_version(self, response: Dict) -> Version:
         try:
             data = response["Msg"]
             return Version(api_version=data["api_ver"], firmware_version=data["fw_ver"])
@@ -404,6 +1038,9 @@ class WhatsminerApi(object):
         response = await self.machine.communicate(
             "status", encrypted=False, expect_response=True
         )
+        return self._parse_status(response)
+
+    def _parse_status(self, response: Dict) -> MinerStatus:
         try:
             data = response["Msg"]
             return MinerStatus(
@@ -466,50 +1103,58 @@ class WhatsminerApi(object):
 
 
 class WhatsminerApi20(WhatsminerApi):
-    def __init__(self, machine: WhatsminerMachine):
+    # The MAC is not part of the summary, it comes from get_miner_info
+    _summary_fields = tuple(
+        ("power_rate", "Power Rate", None) if field[0] == "power_rate" else field
+        for field in SUMMARY_FIELDS
+        if field[0] != "mac"
+    )
+
+    def __init__(self, machine: WhatsminerMachine, mac: Optional[str] = None):
         super().__init__(machine)
+        # Static get_miner_info fields, fetched once and reused. The 2.0 summary
+        # lacks the MAC, so it is filled in from here.
+        self.identity: Dict[str, str] = {"mac": mac} if mac else {}
 
     async def get_summary(self) -> Summary:
-        response = await self.machine.communicate("summary", encrypted=False, expect_response=True)
-        response_info = await self.machine.communicate("get_miner_info", {"info": "mac"})
+        response, _ = await asyncio.gather(
+            self.machine.communicate("summary", encrypted=False, expect_response=True),
+            self.get_identity("mac"),
+        )
+        return self._parse_summary(response)
+
+    async def _fetch(
+            self, commands: Sequence[str], timeout: Optional[float]
+    ) -> Dict[str, Union[Dict, BaseException]]:
+        if "summary" not in commands or "mac" in self.identity:
+            return await super()._fetch(commands, timeout)
+        responses, mac = await asyncio.gather(
+            super()._fetch(commands, timeout),
+            asyncio.wait_for(self.get_identity("mac"), timeout),
+            return_exceptions=True,
+        )
+        if isinstance(mac, BaseException):
+            return {**responses, "summary": mac}
+        return responses
+
+    async def get_identity(self, field: str) -> str:
+        if field not in self.identity:
+            response = await self.machine.communicate("get_miner_info", {"info": field})
+            try:
+                self.identity[field] = response["Msg"][field]
+            except KeyError as error:
+                raise InvalidResponse() from error
+        return self.identity[field]
+
+    def _parse_summary(self, response: Dict) -> Summary:
         try:
-            data = response["SUMMARY"][0]
-            data_info = response_info["Msg"]
-            return Summary(
-                elapsed=data["Elapsed"],
-                average_hash_rate=round(data["MHS av"] / 1000),
-                hash_rate_5s=round(data["MHS 5s"] / 1000),
-                hash_rate_1m=round(data["MHS 1m"] / 1000),
-                hash_rate_5m=round(data["MHS 5m"] / 1000),
-                hash_rate_15m=round(data["MHS 15m"] / 1000),
-                accepted=data["Accepted"],
-                rejected=data["Rejected"],
-                temperature=data["Temperature"],
-                average_frequency=data["freq_avg"],
-                fan_speed_in=data["Fan Speed In"],
-                fan_speed_out=data["Fan Speed Out"],
-                power=data["Power"],
-                power_rate=data["Power Rate"],
-                pool_rejected_percent=data["Pool Rejected%"],
-                pool_stale_percent=data["Pool Stale%"],
-                uptime=data["Uptime"],
-                security_mode=data["Security Mode"] == 0,
-                target_frequency=data["Target Freq"],
-                target_hash_rate=data["Target MHS"] / 1000,
-                environment_temperature=data["Env Temp"],
-                power_mode=data["Power Mode"],
-                chip_temperature_minimum=data["Chip Temp Min"],
-                chip_temperature_maximum=data["Chip Temp Max"],
-                chip_temperature_average=data["Chip Temp Avg"],
-                mac=data_info["mac"],
+            return build_summary(
+                self._summary_fields, response["SUMMARY"][0], mac=self.identity["mac"]
             )
-        except KeyError as error:
+        except (KeyError, IndexError) as error:
             raise InvalidResponse() from error
 
-    async def get_status(self) -> MinerStatus:
-        response = await self.machine.communicate(
-            "status", encrypted=False, expect_response=True
-        )
+    def _parse_status(self, response: Dict) -> MinerStatus:
         try:
             data = response["Msg"]
             return MinerStatus(
@@ -534,17 +1179,84 @@ class WhatsminerApi20(WhatsminerApi):
             "set_high_power", encrypted=True, expect_response=True
         )
 
+
+def api_for_version(
+        machine: WhatsminerMachine, version: Version, mac: Optional[str] = None
+) -> WhatsminerApi:
+    """The API class speaking the protocol of the given get_version reply."""
+    if version.api_version == "whatsminer v1.4.0":
+        return WhatsminerApi(machine)
+
+    if version.api_version[:-1] == "2.0.":
+        return WhatsminerApi20(machine, mac=mac)
+
+    raise UnsupportedVersion(version.api_version)
+
+
+# Parse method of WhatsminerApi for each command supported by WhatsminerApi.read
+_PARSERS = {
+    "devdetails": "_parse_device_details",
+    "summary": "_parse_summary",
+    "get_psu": "_parse_psu",
+    "get_version": "_parse_version",
+    "status": "_parse_status",
+}
+
+
 # ================================ misc helpers ================================
+_STANDARD_SALT = re.compile("\\s*\\$(\\d+)\\$([\\w./]*)\\$")
+# Known answer that tells whether the C library implements md5-crypt
+_MD5_CRYPT_PROBE = ("password", "saltsalt", "$1$saltsalt$qjXMvbEw8oaL.CzflDtaK/")
+
+
+def _passlib_md5_crypt(word: str, salt: str) -> str:
+    return md5_crypt.hash(word, salt=salt)
+
+
+def _load_native_md5_crypt() -> Optional[Callable[[str, str], str]]:
+    """
+    crypt(3) of the C library when it implements md5-crypt. The crypt module is
+    deprecated and gone from Python 3.13, where passlib is used instead.
+    """
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)
+            os_crypt = importlib.import_module("crypt")
+    except ImportError:
+        return None
+
+    def native_md5_crypt(word: str, salt: str) -> str:
+        return os_crypt.crypt(word, f"$1${salt}$")
+
+    word, salt, expected = _MD5_CRYPT_PROBE
+    try:
+        if native_md5_crypt(word, salt) != expected:
+            return None
+    except OSError:
+        return None
+    return native_md5_crypt
+
+
+MD5_CRYPT_BACKENDS: Dict[str, Callable[[str, str], str]] = {"passlib": _passlib_md5_crypt}
+_native_md5_crypt = _load_native_md5_crypt()
+if _native_md5_crypt is not None:
+    MD5_CRYPT_BACKENDS["native"] = _native_md5_crypt
+_md5_crypt = MD5_CRYPT_BACKENDS.get("native", _passlib_md5_crypt)
+
+
 def crypt(word, salt):
-    standard_salt = re.compile("\\s*\\$(\\d+)\\$([\\w./]*)\\$")
-    match = standard_salt.match(salt)
+    match = _STANDARD_SALT.match(salt)
     if not match:
         raise ValueError("salt format is not correct")
     extra_str = match.group(2)
-    result = md5_crypt.hash(word, salt=extra_str)
+    result = _md5_crypt(word, extra_str)
     return result
 
 
+def _derive_key(password: str, salt: str) -> str:
+    return crypt(password, f"$1${salt}$").split("$")[3]
+
+
 def pad(s):
     if len(s) % 16:
         s += "\0" * (16 - len(s) % 16)
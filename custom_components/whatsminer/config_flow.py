@@ -1,33 +1,178 @@
 import asyncio
+import ipaddress
 import logging
-from typing import Any, Dict, Optional
+import re
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Union
 
 import aiohttp
+import async_timeout
 import voluptuous as vol
 from homeassistant import config_entries
-from homeassistant.data_entry_flow import FlowResult
+from homeassistant.core import callback
+from homeassistant.data_entry_flow import FlowResult, FlowResultType
 from homeassistant.helpers.device_registry import format_mac
+from homeassistant.helpers.selector import TextSelector, TextSelectorConfig
 
 from .api import (
     WhatsminerMachine,
     ApiPermissionDenied,
+    InvalidAuth,
     WhatsminerException,
     TokenExceeded,
     DecodeError,
     MinerOffline,
     WhatsminerApi,
-    WhatsminerApi20, UnsupportedVersion
+    UnsupportedVersion,
+    api_for_version
+)
+from .const import (
+    DOMAIN, CONF_HOST, CONF_PORT, CONF_PASSWORD, CONF_MAC, CONF_FLEET_MODE,
+    CONF_AGGREGATION_WINDOW, CONF_API_VERSION, CONF_FIRMWARE_VERSION, CONF_MODEL,
+    CONF_HOSTS, DEFAULT_PORT, BULK_CONNECTIONS, BULK_TIMEOUT, BULK_MAX_HOSTS
 )
-from .const import DOMAIN, CONF_HOST, CONF_PORT, CONF_PASSWORD, CONF_MAC
 
 _LOGGER = logging.getLogger(__name__)
 
 
+async def async_validate(host: str, port: int, password: str) -> Dict[str, Any]:
+    """
+    Checks the password and reads what the entry keeps about the miner, so
+    setting it up needs no probes.
+    """
+    machine = WhatsminerMachine(host, port, password)
+    await machine.check()
+    version = await WhatsminerApi(machine).get_version()
+    api = api_for_version(machine, version)
+    summary = await api.get_summary()
+    details = await api.get_device_details()
+    return {
+        CONF_MAC: format_mac(summary.mac),
+        CONF_API_VERSION: version.api_version,
+        CONF_FIRMWARE_VERSION: version.firmware_version,
+        CONF_MODEL: details[0].model if details else None,
+    }
+
+
+def validation_error(error: BaseException) -> str:
+    """The translation key of the error async_validate failed with."""
+    if isinstance(error, (asyncio.TimeoutError, aiohttp.ClientError)):
+        _LOGGER.info("Cannot connect to miner")
+        return "cannot_connect"
+    if isinstance(error, (InvalidAuth, DecodeError)):
+        return "invalid_auth"
+    if isinstance(error, ApiPermissionDenied):
+        return "api_denied"
+    if isinstance(error, TokenExceeded):
+        return "token_exceeded"
+    if isinstance(error, MinerOffline):
+        return "miner_offline"
+    if isinstance(error, UnsupportedVersion):
+        return "unsupported_version"
+    if isinstance(error, WhatsminerException):
+        _LOGGER.info("Unexpected miner exception", exc_info=error)
+    else:
+        _LOGGER.warning("Unknown error", exc_info=error)
+    return "unknown"
+
+
+class TooManyHosts(ValueError):
+    pass
+
+
+def parse_hosts(text: str) -> List[str]:
+    """
+    The hosts of a comma or whitespace separated list of host names, addresses,
+    networks such as 192.168.1.0/24 and ranges such as 192.168.1.10-192.168.1.50.
+    Raises ValueError for malformed networks and ranges and TooManyHosts past
+    BULK_MAX_HOSTS.
+    """
+    hosts: Dict[str, None] = {}
+
+    def add(addresses) -> None:
+        for address in addresses:
+            hosts[str(address)] = None
+            if len(hosts) > BULK_MAX_HOSTS:
+                raise TooManyHosts(len(hosts))
+
+    for token in re.split(r"[\s,;]+", text.strip()):
+        if not token:
+            continue
+        if "/" in token:
+            network = ipaddress.ip_network(token, strict=False)
+            if network.num_addresses > BULK_MAX_HOSTS + 2:
+                raise TooManyHosts(network.num_addresses)
+            add(network.hosts())
+            continue
+        first, _, last = token.partition("-")
+        try:
+            first_address, last_address = ipaddress.ip_address(first), ipaddress.ip_address(last)
+        except ValueError:
+            # A host name, which may contain dashes as well
+            add((token,))
+            continue
+        if int(last_address) < int(first_address):
+            raise ValueError(token)
+        if int(last_address) - int(first_address) >= BULK_MAX_HOSTS:
+            raise TooManyHosts(int(last_address) - int(first_address) + 1)
+        add(
+            ipaddress.ip_address(value)
+            for value in range(int(first_address), int(last_address) + 1)
+        )
+    return list(hosts)
+
+
+async def async_validate_many(
+        hosts: List[str], port: int, password: str
+) -> Dict[str, Union[Dict[str, Any], str]]:
+    """
+    Runs async_validate for every host, BULK_CONNECTIONS at a time. Maps each
+    host to what async_validate read or to the key of the error it failed with.
+    """
+    limiter = asyncio.Semaphore(BULK_CONNECTIONS)
+
+    async def validate(host: str) -> Union[Dict[str, Any], str]:
+        async with limiter:
+            try:
+                async with async_timeout.timeout(BULK_TIMEOUT):
+                    return await async_validate(host, port, password)
+            except (WhatsminerException, Exception) as error:
+                return validation_error(error)
+
+    results = await asyncio.gather(*(validate(host) for host in hosts))
+    return dict(zip(hosts, results))
+
+
+def _report(added: int, failed: Dict[str, List[str]], limit: int = 20) -> str:
+    lines = [f"Added {added} miners."]
+    for key, hosts in sorted(failed.items()):
+        shown = ", ".join(hosts[:limit])
+        if len(hosts) > limit:
+            shown += f" and {len(hosts) - limit} more"
+        lines.append(f"- {key}: {shown}")
+    return "\n".join(lines)
+
+
 class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
-    VERSION = 1
+    # 2 keeps fleet mode in the options
+    VERSION = 2
+
+    _discovered: Dict[str, Any]
+
+    @staticmethod
+    @callback
+    def async_get_options_flow(
+            config_entry: config_entries.ConfigEntry,
+    ) -> config_entries.OptionsFlow:
+        return OptionsFlow(config_entry)
 
     async def async_step_user(
             self, user_input: Optional[Dict[str, Any]] = None
+    ) -> FlowResult:
+        return self.async_show_menu(step_id="user", menu_options=["host", "bulk"])
+
+    async def async_step_host(
+            self, user_input: Optional[Dict[str, Any]] = None
     ) -> FlowResult:
         errors = {}
         if user_input is not None:
@@ -36,60 +181,189 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 user_input[CONF_PORT],
                 user_input[CONF_PASSWORD],
             )
-            machine = WhatsminerMachine(host, port, password)
             try:
-                await machine.check()
-                api = await self.async_detect_api(machine)
-                version = await api.get_version()
-                summary = await api.get_summary()
-            except (asyncio.TimeoutError, aiohttp.ClientError):
-                _LOGGER.info("Cannot connect to miner")
-                errors["base"] = "cannot_connect"
-            except DecodeError:
-                errors["base"] = "invalid_auth"
-            except ApiPermissionDenied:
-                errors["base"] = "api_denied"
-            except TokenExceeded:
-                errors["base"] = "token_exceeded"
-            except MinerOffline:
-                errors["base"] = "miner_offline"
-            except UnsupportedVersion:
-                errors["base"] = "unsupported_version"
-            except WhatsminerException as e:
-                _LOGGER.info("Unexpected miner exception", exc_info=e)
-                errors["base"] = "unknown"
-            except Exception as e:
-                _LOGGER.warning("Unknown error", exc_info=e)
-                errors["base"] = "unknown"
+                detected = await async_validate(host, port, password)
+            except (WhatsminerException, Exception) as error:
+                errors["base"] = validation_error(error)
             else:
-                if version.api_version != "whatsminer v1.4.0" and version.api_version[:-1] != "2.0.":
-                    errors["base"] = "unsupported_version"
-                else:
-                    mac_address = format_mac(summary.mac)
-                    await self.async_set_unique_id(mac_address)
-                    self._abort_if_unique_id_configured()
-                    return self.async_create_entry(
-                        title="Whatsminer", data={CONF_MAC: mac_address, **user_input}
-                    )
+                await self.async_set_unique_id(detected[CONF_MAC])
+                self._abort_if_unique_id_configured()
+                return self._async_create_miner({**detected, **user_input})
 
         data_schema = {
             vol.Required(CONF_HOST): str,
             vol.Optional(CONF_PORT, default=4028): int,
             vol.Required(CONF_PASSWORD): str,
+            vol.Optional(CONF_FLEET_MODE, default=False): bool,
+        }
+
+        return self.async_show_form(
+            step_id="host", data_schema=vol.Schema(data_schema), errors=errors
+        )
+
+    async def async_step_bulk(
+            self, user_input: Optional[Dict[str, Any]] = None
+    ) -> FlowResult:
+        """
+        Validates a list of hosts sharing one password in a single pass. Valid
+        miners are added through import flows, which are awaited so the report
+        only counts entries that exist. The form then comes back with the
+        result of every host and the hosts that answered but failed.
+        """
+        errors = {}
+        report = ""
+        defaults = user_input or {}
+        if user_input is not None:
+            try:
+                hosts = parse_hosts(user_input[CONF_HOSTS])
+            except TooManyHosts:
+                errors[CONF_HOSTS] = "too_many_hosts"
+            except ValueError:
+                errors[CONF_HOSTS] = "invalid_hosts"
+            else:
+                port, password = user_input[CONF_PORT], user_input[CONF_PASSWORD]
+                results = await async_validate_many(hosts, port, password)
+                configured = self._async_current_ids()
+                imports: Dict[str, Dict[str, Any]] = {}
+                failed: Dict[str, List[str]] = defaultdict(list)
+                for host, result in results.items():
+                    if isinstance(result, str):
+                        failed[result].append(host)
+                    elif result[CONF_MAC] in configured or any(
+                            result[CONF_MAC] == data[CONF_MAC] for data in imports.values()
+                    ):
+                        failed["already_configured"].append(host)
+                    else:
+                        imports[host] = {
+                            **result,
+                            CONF_HOST: host,
+                            CONF_PORT: port,
+                            CONF_PASSWORD: password,
+                            CONF_FLEET_MODE: user_input[CONF_FLEET_MODE],
+                        }
+                # Only entries that were actually created are reported as added
+                outcomes = await asyncio.gather(*(
+                    self.hass.config_entries.flow.async_init(
+                        DOMAIN, context={"source": config_entries.SOURCE_IMPORT}, data=data
+                    )
+                    for data in imports.values()
+                ))
+                added = 0
+                for host, outcome in zip(imports, outcomes):
+                    if outcome["type"] == FlowResultType.CREATE_ENTRY:
+                        added += 1
+                    else:
+                        failed[outcome.get("reason", "unknown")].append(host)
+                # Unreachable addresses are expected when scanning a range
+                retry = [
+                    host for key, hosts in failed.items()
+                    if key not in ("already_configured", "cannot_connect", "miner_offline")
+                    for host in hosts
+                ]
+                if not retry:
+                    return self.async_abort(
+                        reason="bulk_added",
+                        description_placeholders={"results": _report(added, failed)},
+                    )
+                report = _report(added, failed)
+                defaults = {**user_input, CONF_HOSTS: "\n".join(retry)}
+
+        data_schema = {
+            vol.Required(CONF_HOSTS, default=defaults.get(CONF_HOSTS, "")): TextSelector(
+                TextSelectorConfig(multiline=True)
+            ),
+            vol.Optional(CONF_PORT, default=defaults.get(CONF_PORT, DEFAULT_PORT)): int,
+            vol.Required(CONF_PASSWORD, default=defaults.get(CONF_PASSWORD, "")): str,
+            vol.Optional(CONF_FLEET_MODE, default=defaults.get(CONF_FLEET_MODE, True)): bool,
+        }
+
+        return self.async_show_form(
+            step_id="bulk",
+            data_schema=vol.Schema(data_schema),
+            errors=errors,
+            description_placeholders={"results": report},
+        )
+
+    async def async_step_import(self, import_data: Dict[str, Any]) -> FlowResult:
+        """A miner the bulk step already validated."""
+        await self.async_set_unique_id(import_data[CONF_MAC])
+        self._abort_if_unique_id_configured()
+        return self._async_create_miner(import_data)
+
+    async def async_step_integration_discovery(
+            self, discovery_info: Dict[str, Any]
+    ) -> FlowResult:
+        """A miner found by the subnet scan, see discovery.py."""
+        await self.async_set_unique_id(discovery_info[CONF_MAC])
+        # A known miner may have got another address
+        self._abort_if_unique_id_configured(
+            updates={CONF_HOST: discovery_info[CONF_HOST], CONF_PORT: discovery_info[CONF_PORT]}
+        )
+        self._discovered = discovery_info
+        self.context["title_placeholders"] = self._placeholders()
+        return await self.async_step_discovery_confirm()
+
+    async def async_step_discovery_confirm(
+            self, user_input: Optional[Dict[str, Any]] = None
+    ) -> FlowResult:
+        errors = {}
+        host, port = self._discovered[CONF_HOST], self._discovered[CONF_PORT]
+        if user_input is not None:
+            try:
+                detected = await async_validate(host, port, user_input[CONF_PASSWORD])
+            except (WhatsminerException, Exception) as error:
+                errors["base"] = validation_error(error)
+            else:
+                return self._async_create_miner(
+                    {**detected, CONF_HOST: host, CONF_PORT: port, **user_input}
+                )
+
+        data_schema = {
+            vol.Required(CONF_PASSWORD): str,
+            vol.Optional(CONF_FLEET_MODE, default=False): bool,
         }
 
         return self.async_show_form(
-            step_id="user", data_schema=vol.Schema(data_schema), errors=errors
+            step_id="discovery_confirm",
+            data_schema=vol.Schema(data_schema),
+            errors=errors,
+            description_placeholders=self._placeholders(),
         )
 
-    async def async_detect_api(self, machine: WhatsminerMachine) -> WhatsminerApi:
-        api = WhatsminerApi(machine)
-        version = await api.get_version()
+    def _async_create_miner(self, data: Dict[str, Any]) -> FlowResult:
+        """Fleet mode is asked for when adding, but kept as an option to change later."""
+        data = dict(data)
+        fleet_mode = data.pop(CONF_FLEET_MODE, False)
+        return self.async_create_entry(
+            title="Whatsminer", data=data, options={CONF_FLEET_MODE: fleet_mode}
+        )
 
-        if version.api_version == "whatsminer v1.4.0":
-            return api
+    def _placeholders(self) -> Dict[str, str]:
+        return {
+            "model": self._discovered[CONF_MODEL] or "Whatsminer",
+            "host": self._discovered[CONF_HOST],
+        }
 
-        if version.api_version[:-1] == "2.0.":
-            return WhatsminerApi20(machine)
 
-        raise UnsupportedVersion(version.api_version)
+class OptionsFlow(config_entries.OptionsFlow):
+    def __init__(self, config_entry: config_entries.ConfigEntry):
+        self.config_entry = config_entry
+
+    async def async_step_init(
+            self, user_input: Optional[Dict[str, Any]] = None
+    ) -> FlowResult:
+        if user_input is not None:
+            return self.async_create_entry(title="", data=user_input)
+
+        data_schema = {
+            vol.Optional(
+                CONF_AGGREGATION_WINDOW,
+                default=self.config_entry.options.get(CONF_AGGREGATION_WINDOW, 0),
+            ): vol.All(int, vol.Range(min=0, max=3600)),
+            vol.Optional(
+                CONF_FLEET_MODE,
+                default=self.config_entry.options.get(CONF_FLEET_MODE, False),
+            ): bool,
+        }
+
+        return self.async_show_form(step_id="init", data_schema=vol.Schema(data_schema))
@@ -6,3 +6,29 @@ CONF_HOST = "host"
 CONF_PORT = "port"
 CONF_PASSWORD = "password"
 CONF_MAC = "mac"
+CONF_FLEET_MODE = "fleet_mode"
+CONF_HOSTS = "hosts"
+# Detected from the miner and kept in the entry, so starting HA needs no probes
+CONF_API_VERSION = "api_version"
+CONF_FIRMWARE_VERSION = "firmware_version"
+CONF_MODEL = "model"
+# Seconds over which readings are aggregated before publishing, 0 publishes every poll
+CONF_AGGREGATION_WINDOW = "aggregation_window"
+
+FLEET = "fleet"
+FLEET_MAX_CONNECTIONS = 32
+
+# YAML options of the subnet scan offering miners as discovered entries
+CONF_DISCOVERY = "discovery"
+CONF_NETWORKS = "networks"
+CONF_CONNECTIONS = "connections"
+CONF_TIMEOUT = "timeout"
+CONF_SCAN_INTERVAL = "scan_interval"
+DEFAULT_PORT = 4028
+SCAN_CONNECTIONS = 128
+SCAN_TIMEOUT = 1.0
+
+# Bulk onboarding validates this many hosts at once, each within BULK_TIMEOUT seconds
+BULK_CONNECTIONS = 32
+BULK_TIMEOUT = 15
+BULK_MAX_HOSTS = 1024
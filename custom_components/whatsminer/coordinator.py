@@ -1,12 +1,14 @@
 import logging
+import time
 from dataclasses import dataclass
 from datetime import timedelta
-from typing import Optional
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, TYPE_CHECKING
 
 import async_timeout
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback, CALLBACK_TYPE
 from homeassistant.exceptions import ConfigEntryAuthFailed
+from homeassistant.helpers import device_registry as dr
 from homeassistant.helpers.update_coordinator import (
     DataUpdateCoordinator,
     UpdateFailed,
@@ -15,79 +17,238 @@ from homeassistant.helpers.update_coordinator import (
 from .api import (
     WhatsminerMachine,
     WhatsminerApi,
-    WhatsminerApi20,
     Summary,
     PowerUnitDetails,
     Version,
+    MinerStatus,
     WhatsminerException,
     TokenError,
     DecodeError,
-    MinerOffline, UnsupportedVersion
+    MinerOffline, InvalidCommand, api_for_version
 )
-from .const import DOMAIN, CONF_HOST, CONF_PORT, CONF_PASSWORD, CONF_MAC
+from .aggregation import Aggregator
+from .derived import DerivedMetrics, DerivedTracker
+from .const import (
+    DOMAIN, CONF_HOST, CONF_PORT, CONF_PASSWORD, CONF_MAC, CONF_AGGREGATION_WINDOW,
+    CONF_API_VERSION, CONF_FIRMWARE_VERSION, CONF_MODEL
+)
+
+if TYPE_CHECKING:
+    from .fleet import WhatsminerFleetCoordinator
 
 _LOGGER = logging.getLogger(__name__)
 
+UPDATE_INTERVAL = timedelta(seconds=5)
+# A poll has to end before the next one starts, late parts are left for later
+POLL_BUDGET = UPDATE_INTERVAL * 0.8
+# How long past its refresh period a part that failed to update is still served
+STALE_LIMIT = timedelta(minutes=1)
+
+# How often each command is read again, the coordinator ticks every UPDATE_INTERVAL
+REFRESH_PERIODS: Dict[str, timedelta] = {
+    "summary": timedelta(seconds=5),
+    "status": timedelta(seconds=15),
+    "get_psu": timedelta(hours=1),
+    "get_version": timedelta(hours=1),
+    "devdetails": timedelta(hours=1),
+}
+# Read again right away when the miner rebooted, e.g. after a firmware update
+REBOOT_EXPIRED_COMMANDS = ("get_psu", "get_version", "devdetails")
+# Read again when a command is rejected, the firmware may speak another API now
+REVALIDATED_COMMANDS = ("get_version", "devdetails")
+# Nothing depends on these, a poll succeeds without them
+OPTIONAL_COMMANDS = ("get_psu",)
+# The OnlineMinerData field holding the reply of a command entities subscribe to
+READING_FIELDS = {"summary": "summary", "get_psu": "power_unit"}
+# Read whether or not an entity subscribed: the status tells whether the miner is
+# online, version and model are part of every reading and the device info
+ALWAYS_POLLED = ("status", "get_version", "devdetails")
+
 
-@dataclass
+# Slotted and immutable, a fresh set is built for every miner on every poll
+@dataclass(frozen=True, slots=True)
 class MinerData(object):
     device_model: Optional[str]
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class OnlineMinerData(MinerData):
-    summary: Summary
-    power_unit: PowerUnitDetails
+    # None while no entity subscribed to the summary
+    summary: Optional[Summary]
+    power_unit: Optional[PowerUnitDetails]
     version: Version
+    # Commands that failed this poll and whose last good reading is used instead
+    stale: FrozenSet[str] = frozenset()
+    # Efficiency, acceptance and moving averages, None along with the summary
+    derived: Optional[DerivedMetrics] = None
+
+
+class RefreshSchedule(object):
+    """
+    Tracks when each command was last read successfully and which commands are
+    due again. Commands never read are always due.
+    """
+
+    def __init__(self, periods: Dict[str, timedelta], tolerance: timedelta):
+        self.periods = periods
+        # Ticks are not exact, a command due slightly after this tick is read now
+        self._tolerance = tolerance.total_seconds()
+        self._last_read: Dict[str, float] = {}
+        self._expired: Set[str] = set()
+
+    def due(self, now: float) -> List[str]:
+        return [
+            command
+            for command, period in self.periods.items()
+            if command not in self._last_read
+               or command in self._expired
+               or now - self._last_read[command] + self._tolerance >= period.total_seconds()
+        ]
+
+    def age(self, command: str, now: float) -> Optional[float]:
+        last_read = self._last_read.get(command)
+        return None if last_read is None else now - last_read
+
+    def mark(self, command: str, now: float) -> None:
+        self._last_read[command] = now
+        self._expired.discard(command)
+
+    def expire(self, *commands: str) -> None:
+        """Makes commands due right away, their age is kept."""
+        self._expired.update(commands)
 
 
 class WhatsminerCoordinator(DataUpdateCoordinator[MinerData]):
-    def __init__(self, hass: HomeAssistant, entry: ConfigEntry):
+    def __init__(
+            self,
+            hass: HomeAssistant,
+            entry: ConfigEntry,
+            fleet: Optional["WhatsminerFleetCoordinator"] = None,
+    ):
+        # Fleet members have no timer of their own, the fleet pushes their data
         super(WhatsminerCoordinator, self).__init__(
             hass,
             logging.getLogger(__name__),
             name=DOMAIN,
             update_method=self.async_fetch,
-            update_interval=timedelta(seconds=5),
+            update_interval=None if fleet else UPDATE_INTERVAL,
         )
 
         host = entry.data[CONF_HOST]
         port = entry.data[CONF_PORT]
         password = entry.data[CONF_PASSWORD]
-        self.machine = WhatsminerMachine(host, port, password)
+        self.entry_id = entry.entry_id
+        self._entry = entry
+        # Options the entry was set up with, changing them reloads it
+        self.options = dict(entry.options)
+        self.fleet = fleet
+        self.machine = WhatsminerMachine(
+            host, port, password, fleet.connection_limiter if fleet else None
+        )
         self.api: WhatsminerApi = WhatsminerApi(self.machine)
         self.version: Optional[Version] = None
         self.device_host: str = host
         self.device_model: Optional[str] = None
         self.device_mac: str = entry.data[CONF_MAC]
+        self.schedule = RefreshSchedule(REFRESH_PERIODS, UPDATE_INTERVAL / 2)
+        # How many entities need each command. Lazy polling starts once the
+        # platforms are set up, before the first poll of the entry, so from then
+        # on only commands subscribed and ALWAYS_POLLED are read. Until then, e.g.
+        # when a fleet cycle runs during setup, every command is read.
+        self.subscriptions: Dict[str, int] = {}
+        self._lazy = False
+        # Last successful reading of every command, reused until it is due again
+        self._readings: Dict[str, Any] = {}
+        # What _async_persist last stored or tried to store
+        self._persisted: Optional[Dict[str, Any]] = None
+        self._restore(entry)
+        self.derived = DerivedTracker()
+        window = entry.options.get(CONF_AGGREGATION_WINDOW, 0)
+        self.aggregator: Optional[Aggregator] = (
+            Aggregator(max(1, round(window / UPDATE_INTERVAL.total_seconds())))
+            if window else None
+        )
 
     async def async_fetch(self) -> MinerData:
         try:
+            now = time.monotonic()
+            deadline = now + POLL_BUDGET.total_seconds()
             if self.version is None:
-                self.api = await self.detect_api()
+                async with async_timeout.timeout(POLL_BUDGET.total_seconds()):
+                    self.api = await self.detect_api()
+                self.schedule.mark("get_version", now)
+
+            # The reads share one request where the firmware allows batching and
+            # run concurrently otherwise, whatever is late keeps its last value
+            due = [command for command in self.schedule.due(now) if self._wanted(command)]
+            readings = (
+                await self.api.read(*due, timeout=max(deadline - time.monotonic(), 0))
+                if due else {}
+            )
 
-            status = await self.api.get_status()
+            errors: Dict[str, BaseException] = {}
+            stale: Set[str] = set()
+            for command, reading in readings.items():
+                if not isinstance(reading, BaseException):
+                    if command == "summary":
+                        self._detect_reboot(reading)
+                        self.derived.add(reading, now)
+                    self._readings[command] = reading
+                    self.schedule.mark(command, now)
+                    continue
+                if isinstance(reading, InvalidCommand) and command not in REVALIDATED_COMMANDS:
+                    _LOGGER.debug(
+                        "%s rejected %s, checking its API version", self.device_host, command
+                    )
+                    self.schedule.expire(*REVALIDATED_COMMANDS)
+                if self._can_serve_stale(command, reading, now):
+                    _LOGGER.debug(
+                        "Keeping last %s of %s: %r", command, self.device_host, reading
+                    )
+                    stale.add(command)
+                else:
+                    errors[command] = reading
 
-            if self.device_model is None:
-                async with async_timeout.timeout(10):
-                    details = await self.api.get_device_details()
-                    self.device_model = details[0].model
+            # An offline miner fails the other reads, so the status is checked first
+            status: MinerStatus = self._reading(errors, "status")
+            version: Version = self._reading(errors, "get_version")
+            if version.api_version != self.version.api_version:
+                _LOGGER.info(
+                    "Miner %s now speaks API %s", self.device_host, version.api_version
+                )
+                self.api = api_for_version(self.machine, version, self.device_mac)
+            self.version = version
+            if "devdetails" in self._readings or "devdetails" in errors:
+                self.device_model = self._reading(errors, "devdetails")[0].model
 
             if not status.miner_online:
                 raise MinerOffline()
 
-            async with async_timeout.timeout(10):
-                summary = await self.api.get_summary()
+            summary = self._reading(errors, "summary") if self._wanted("summary") else None
+            psu = self._readings.get("get_psu") if self._wanted("get_psu") else None
 
-            async with async_timeout.timeout(10):
-                psu = await self.api.get_psu()
-
-            return OnlineMinerData(
-                self.device_model, summary=summary, power_unit=psu, version=self.version
+            data = OnlineMinerData(
+                self.device_model,
+                summary=summary,
+                power_unit=psu,
+                version=self.version,
+                stale=frozenset(stale),
+                derived=self.derived.metrics if summary is not None else None,
             )
+            # A summary kept from an earlier poll was already counted once
+            if self.aggregator is not None and summary is not None and "summary" not in stale:
+                self.aggregator.add(data)
+            # Stored after the poll returned, so a registry error cannot fail it
+            self.hass.loop.call_soon(self._async_persist)
+            return data
         except (TokenError, DecodeError) as error:
             raise ConfigEntryAuthFailed from error
         except MinerOffline:
+            # Watch closely for the miner coming back
+            self.schedule.expire("status")
+            if self.aggregator is not None:
+                self.aggregator.reset()
+            self.derived.clear()
             return MinerData(self.device_model)
         except WhatsminerException as error:
             raise UpdateFailed from error
@@ -95,14 +256,108 @@ class WhatsminerCoordinator(DataUpdateCoordinator[MinerData]):
             _LOGGER.warning("Unexpected error: %s", error)
             raise UpdateFailed from error
 
-    async def detect_api(self):
-        api = WhatsminerApi(self.machine)
-        self.version = await api.get_version()
+    @callback
+    def async_subscribe(self, commands: Iterable[str]) -> CALLBACK_TYPE:
+        """
+        Declares that an entity reads the replies of commands. Entities subscribe
+        when added to HA, which only adds enabled ones, and unsubscribe when
+        removed or disabled, so the commands read follow the entity registry.
+        """
+        commands = tuple(commands)
+        for command in commands:
+            self.subscriptions[command] = self.subscriptions.get(command, 0) + 1
+            if self.subscriptions[command] == 1:
+                # Newly needed, read it on the next poll whatever its period
+                self.schedule.expire(command)
+
+        @callback
+        def unsubscribe() -> None:
+            for command in commands:
+                self.subscriptions[command] -= 1
+
+        return unsubscribe
+
+    @callback
+    def async_enable_lazy_polling(self) -> None:
+        """Called once the entities are set up and subscribed."""
+        self._lazy = True
+        _LOGGER.debug(
+            "Polling %s for %s", self.device_host,
+            sorted(command for command, count in self.subscriptions.items() if count)
+        )
+
+    def _wanted(self, command: str) -> bool:
+        return not self._lazy or command in ALWAYS_POLLED or bool(self.subscriptions.get(command))
+
+    def _can_serve_stale(self, command: str, error: BaseException, now: float) -> bool:
+        if isinstance(error, MinerOffline):
+            return False
+        if command in OPTIONAL_COMMANDS:
+            return True
+        age = self.schedule.age(command, now)
+        return age is not None and age <= (REFRESH_PERIODS[command] + STALE_LIMIT).total_seconds()
 
-        if self.version.api_version == "whatsminer v1.4.0":
-            return api
+    def _reading(self, errors: Dict[str, BaseException], command: str) -> Any:
+        if command in errors:
+            raise errors[command]
+        return self._readings[command]
 
-        if self.version.api_version[:-1] == "2.0.":
-            return WhatsminerApi20(self.machine)
+    def _detect_reboot(self, summary: Summary) -> None:
+        previous: Optional[Summary] = self._readings.get("summary")
+        if previous is None:
+            return
+        if summary.uptime < previous.uptime or summary.elapsed < previous.elapsed:
+            _LOGGER.debug("Miner %s rebooted, refreshing static data", self.device_host)
+            self.schedule.expire(*REBOOT_EXPIRED_COMMANDS)
 
-        raise UnsupportedVersion(self.version.api_version)
\ No newline at end of file
+    @callback
+    def async_handle_fleet_update(self) -> None:
+        error = self.fleet.errors.get(self.entry_id)
+        if error is not None:
+            self.async_set_update_error(error)
+        elif self.entry_id in self.fleet.data:
+            self.async_set_updated_data(self.fleet.data[self.entry_id])
+
+    def _restore(self, entry: ConfigEntry) -> None:
+        """Takes what an earlier start detected from the entry instead of probing."""
+        now = time.monotonic()
+        api_version = entry.data.get(CONF_API_VERSION)
+        if api_version is not None:
+            self.version = Version(api_version, entry.data.get(CONF_FIRMWARE_VERSION, ""))
+            self.api = api_for_version(self.machine, self.version, self.device_mac)
+            self._readings["get_version"] = self.version
+            self.schedule.mark("get_version", now)
+        self.device_model = entry.data.get(CONF_MODEL)
+        if self.device_model is not None:
+            self.schedule.mark("devdetails", now)
+
+    @callback
+    def _async_persist(self) -> None:
+        detected = {
+            CONF_API_VERSION: self.version.api_version,
+            CONF_FIRMWARE_VERSION: self.version.firmware_version,
+            CONF_MODEL: self.device_model,
+        }
+        # Tried once per change, not on every poll
+        if detected == self._persisted:
+            return
+        self._persisted = detected
+        data = self._entry.data
+        if all(data.get(key) == value for key, value in detected.items()):
+            return
+        try:
+            if self.device_model != data.get(CONF_MODEL):
+                registry = dr.async_get(self.hass)
+                device = registry.async_get_device(identifiers={(DOMAIN, self.device_mac)})
+                if device is not None:
+                    registry.async_update_device(device.id, model=self.device_model)
+            self.hass.config_entries.async_update_entry(self._entry, data={**data, **detected})
+        except Exception as error:
+            _LOGGER.warning(
+                "Cannot store the API version and model of %s: %r", self.device_host, error
+            )
+
+    async def detect_api(self):
+        self.version = await WhatsminerApi(self.machine).get_version()
+        self._readings["get_version"] = self.version
+        return api_for_version(self.machine, self.version, self.device_mac)
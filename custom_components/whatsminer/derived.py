@@ -0,0 +1,99 @@
+"""
+Metrics derived from consecutive summaries
+"""
+from __future__ import annotations
+
+import dataclasses
+import math
+from typing import Optional
+
+from .api import Summary
+
+# Seconds after which a sample weighs 1/e in the moving averages
+EWMA_TIME_CONSTANT = 300.0
+
+
+class Ewma(object):
+    """Exponentially weighted moving average of samples taken at any interval."""
+
+    __slots__ = ("time_constant", "value", "_last")
+
+    def __init__(self, time_constant: float):
+        self.time_constant = time_constant
+        self.value: Optional[float] = None
+        self._last: Optional[float] = None
+
+    def add(self, sample: float, now: float) -> float:
+        if self.value is None:
+            self.value = float(sample)
+        else:
+            # A sample after a longer gap moves the average further
+            alpha = 1 - math.exp(-(now - self._last) / self.time_constant)
+            self.value += alpha * (sample - self.value)
+        self._last = now
+        return self.value
+
+    def clear(self) -> None:
+        self.value = None
+        self._last = None
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class DerivedMetrics(object):
+    # W/TH from the 5 minute hash rate, None while nothing hashes
+    efficiency: Optional[float]
+    # Percent of the shares accepted, recent shares weigh more. None until the
+    # counters moved between two summaries
+    acceptance_rate: Optional[float]
+    # Moving averages of the 5 second hash rate in GH/s and of the temperature
+    hash_rate_average: float
+    temperature_average: float
+
+
+class DerivedTracker(object):
+    """
+    Updates the derived metrics with every new summary in constant time and
+    memory, instead of going through the history of the readings.
+    """
+
+    def __init__(self, time_constant: float = EWMA_TIME_CONSTANT):
+        self._hash_rate = Ewma(time_constant)
+        self._temperature = Ewma(time_constant)
+        self._accepted = Ewma(time_constant)
+        self._rejected = Ewma(time_constant)
+        self._previous: Optional[Summary] = None
+        self.metrics: Optional[DerivedMetrics] = None
+
+    def add(self, summary: Summary, now: float) -> DerivedMetrics:
+        previous = self._previous
+        # The counters start over when the miner restarts, that step is skipped
+        if (
+                previous is not None
+                and summary.accepted >= previous.accepted
+                and summary.rejected >= previous.rejected
+        ):
+            self._accepted.add(summary.accepted - previous.accepted, now)
+            self._rejected.add(summary.rejected - previous.rejected, now)
+        self._previous = summary
+
+        accepted, rejected = self._accepted.value, self._rejected.value
+        self.metrics = DerivedMetrics(
+            efficiency=(
+                summary.power / (summary.hash_rate_5m / 1000)
+                if summary.hash_rate_5m > 0 else None
+            ),
+            acceptance_rate=(
+                100 * accepted / (accepted + rejected)
+                if accepted is not None and accepted + rejected > 0 else None
+            ),
+            hash_rate_average=self._hash_rate.add(summary.hash_rate_5s, now),
+            temperature_average=self._temperature.add(summary.temperature, now),
+        )
+        return self.metrics
+
+    def clear(self) -> None:
+        """Starts over, e.g. once the miner went offline."""
+        for average in (self._hash_rate, self._temperature, self._accepted, self._rejected):
+            average.clear()
+        self._previous = None
+        self.metrics = None
@@ -0,0 +1,61 @@
+"""
+Diagnostics download with the timings and errors of every command
+"""
+from __future__ import annotations
+
+import dataclasses
+import time
+from typing import Any, Dict
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN, COORDINATOR, CONF_PASSWORD
+from .coordinator import WhatsminerCoordinator
+
+TO_REDACT = {CONF_PASSWORD}
+
+
+def _as_dict(data) -> Any:
+    if data is None:
+        return None
+    result = dataclasses.asdict(data)
+    if "stale" in result:
+        result["stale"] = sorted(result["stale"])
+    return result
+
+
+async def async_get_config_entry_diagnostics(
+        hass: HomeAssistant, entry: ConfigEntry
+) -> Dict[str, Any]:
+    coordinator: WhatsminerCoordinator = hass.data[DOMAIN][entry.entry_id][COORDINATOR]
+    machine = coordinator.machine
+    now = time.monotonic()
+
+    return {
+        "entry": async_redact_data(entry.as_dict(), TO_REDACT),
+        "coordinator": {
+            "last_update_success": coordinator.last_update_success,
+            "last_exception": repr(coordinator.last_exception),
+            "fleet_mode": coordinator.fleet is not None,
+            "api": type(coordinator.api).__name__,
+            "device_model": coordinator.device_model,
+            "version": dataclasses.asdict(coordinator.version) if coordinator.version else None,
+            "subscriptions": coordinator.subscriptions,
+            "reading_age_s": {
+                command: coordinator.schedule.age(command, now)
+                for command in coordinator.schedule.periods
+            },
+            "data": _as_dict(coordinator.data),
+        },
+        "machine": {
+            "batch_supported": machine._batch_supported,
+            "breaker": {
+                "state": machine.breaker.state,
+                "failures": machine.breaker.failures,
+            },
+            "slowest_command": machine.stats.slowest(),
+            "commands": machine.stats.as_dict(),
+        },
+    }
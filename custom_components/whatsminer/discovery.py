@@ -0,0 +1,159 @@
+"""
+Find miners by scanning subnets
+"""
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import ipaddress
+import logging
+from datetime import timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import async_timeout
+from homeassistant.config_entries import SOURCE_INTEGRATION_DISCOVERY
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import discovery_flow
+from homeassistant.helpers.device_registry import format_mac
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.start import async_at_started
+
+from .api import (
+    WhatsminerMachine,
+    WhatsminerApi,
+    WhatsminerException,
+    api_for_version
+)
+from .const import (
+    DOMAIN, CONF_HOST, CONF_PORT, CONF_MAC, CONF_API_VERSION, CONF_FIRMWARE_VERSION,
+    CONF_MODEL, CONF_NETWORKS, CONF_CONNECTIONS, CONF_TIMEOUT, CONF_SCAN_INTERVAL,
+    DEFAULT_PORT, SCAN_CONNECTIONS, SCAN_TIMEOUT
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class DiscoveredMiner(object):
+    host: str
+    port: int
+    mac: str
+    api_version: str
+    firmware_version: str
+    model: Optional[str]
+
+    def as_discovery_info(self) -> Dict[str, Any]:
+        return {
+            CONF_HOST: self.host,
+            CONF_PORT: self.port,
+            CONF_MAC: self.mac,
+            CONF_API_VERSION: self.api_version,
+            CONF_FIRMWARE_VERSION: self.firmware_version,
+            CONF_MODEL: self.model,
+        }
+
+
+def _hosts(networks: Iterable[str]) -> Iterator[str]:
+    """
+    Every host of the networks once. Overlapping networks are merged up front,
+    so nothing has to remember the hosts already yielded.
+    """
+    parsed = [ipaddress.ip_network(network, strict=False) for network in networks]
+    for version in (4, 6):
+        for network in ipaddress.collapse_addresses(
+                network for network in parsed if network.version == version
+        ):
+            for address in network.hosts():
+                yield str(address)
+
+
+async def async_fingerprint(
+        host: str, port: int = DEFAULT_PORT, timeout: float = SCAN_TIMEOUT
+) -> Optional[DiscoveredMiner]:
+    """
+    Identifies a miner with the commands that need no password: get_version
+    picks the API, then summary and devdetails share one request where the
+    firmware joins commands. None when nothing, or no supported miner, answers
+    within timeout seconds.
+    """
+    machine = WhatsminerMachine(host, port)
+    try:
+        async with async_timeout.timeout(timeout):
+            version = await WhatsminerApi(machine).get_version()
+            api = api_for_version(machine, version)
+            readings = await api.read("summary", "devdetails")
+    except (WhatsminerException, OSError, asyncio.TimeoutError, ValueError) as error:
+        _LOGGER.debug("No miner at %s:%s: %r", host, port, error)
+        return None
+
+    summary = readings["summary"]
+    if isinstance(summary, BaseException):
+        _LOGGER.debug("Miner at %s:%s did not send its summary: %r", host, port, summary)
+        return None
+    details = readings["devdetails"]
+    model = details[0].model if not isinstance(details, BaseException) and details else None
+    return DiscoveredMiner(
+        host=host,
+        port=port,
+        mac=format_mac(summary.mac),
+        api_version=version.api_version,
+        firmware_version=version.firmware_version,
+        model=model,
+    )
+
+
+async def async_scan(
+        networks: Iterable[str],
+        port: int = DEFAULT_PORT,
+        connections: int = SCAN_CONNECTIONS,
+        timeout: float = SCAN_TIMEOUT,
+) -> List[DiscoveredMiner]:
+    """
+    Fingerprints every host of the given CIDR ranges. A fixed pool of
+    connections workers takes the hosts one after another, so at most that
+    many hosts are probed at once and memory does not grow with the range.
+    Most addresses of a range do not answer, each costs at most timeout
+    seconds, so a /22 with the defaults takes well under ten seconds.
+    """
+    hosts = _hosts(networks)
+    found: List[DiscoveredMiner] = []
+
+    async def worker() -> None:
+        for host in hosts:
+            miner = await async_fingerprint(host, port, timeout)
+            if miner is not None:
+                found.append(miner)
+
+    await asyncio.gather(*(worker() for _ in range(connections)))
+    return found
+
+
+async def async_discover(hass: HomeAssistant, config: Dict[str, Any]) -> None:
+    """Offers every miner found in the configured networks as a discovered entry."""
+    miners = await async_scan(
+        config[CONF_NETWORKS],
+        connections=config[CONF_CONNECTIONS],
+        timeout=config[CONF_TIMEOUT],
+    )
+    _LOGGER.debug("Found %d miners in %s", len(miners), ", ".join(config[CONF_NETWORKS]))
+    # Already configured miners are filtered by the flow, which also updates
+    # their host when DHCP moved them
+    for miner in miners:
+        discovery_flow.async_create_flow(
+            hass,
+            DOMAIN,
+            context={"source": SOURCE_INTEGRATION_DISCOVERY},
+            data=miner.as_discovery_info(),
+        )
+
+
+def async_setup_discovery(hass: HomeAssistant, config: Dict[str, Any]) -> None:
+    """Scans once HA has started and again every scan interval."""
+
+    async def scan(*_) -> None:
+        await async_discover(hass, config)
+
+    async_at_started(hass, scan)
+    async_track_time_interval(
+        hass, scan, timedelta(seconds=config[CONF_SCAN_INTERVAL]), cancel_on_shutdown=True
+    )
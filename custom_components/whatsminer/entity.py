@@ -1,5 +1,7 @@
 import logging
+from typing import Any, Iterable, Optional, Tuple
 
+from homeassistant.core import callback
 from homeassistant.helpers.device_registry import CONNECTION_NETWORK_MAC
 from homeassistant.helpers.entity import DeviceInfo
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
@@ -10,6 +12,49 @@ from .coordinator import OnlineMinerData
 
 
 class WhatsminerEntity(CoordinatorEntity[WhatsminerCoordinator]):
+    # Availability and value of the last state written to HA
+    _written: Optional[Tuple[bool, Any]] = None
+
+    def _commands(self) -> Iterable[str]:
+        """Commands whose replies the entity shows, only subscribed ones are polled."""
+        return ()
+
+    async def async_added_to_hass(self) -> None:
+        await super(WhatsminerEntity, self).async_added_to_hass()
+        commands = tuple(self._commands())
+        if commands:
+            self.async_on_remove(self.coordinator.async_subscribe(commands))
+
+    def _tracked_value(self) -> Any:
+        """The value shown as state, nothing is written while it stays the same."""
+        return None
+
+    def _value_changed(self, written: Any, value: Any) -> bool:
+        return written != value
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        # Most values of a poll repeat the previous one, across a fleet writing
+        # them all would flood the state machine and the recorder
+        if self._written is not None:
+            written_available, written_value = self._written
+            available = self.available
+            value = self._tracked_value() if available else None
+            if written_available == available and not self._value_changed(written_value, value):
+                return
+        self.async_write_ha_state()
+
+    @callback
+    def async_write_ha_state(self) -> None:
+        available = self.available
+        self._written = (available, self._tracked_value() if available else None)
+        super(WhatsminerEntity, self).async_write_ha_state()
+
+    @property
+    def available(self) -> bool:
+        # Unavailable until the first refresh, which runs after setup
+        return super(WhatsminerEntity, self).available and self.coordinator.data is not None
+
     @property
     def device_info(self):
         return DeviceInfo(
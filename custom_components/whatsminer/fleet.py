@@ -0,0 +1,274 @@
+"""
+Poll many miners from a single timer
+"""
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import importlib
+import logging
+import math
+from array import array
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from homeassistant.core import HomeAssistant, callback, CALLBACK_TYPE
+from homeassistant.helpers.entity import Entity
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
+
+from .const import DOMAIN, FLEET_MAX_CONNECTIONS
+from .coordinator import MinerData, OnlineMinerData, WhatsminerCoordinator, UPDATE_INTERVAL
+
+_LOGGER = logging.getLogger(__name__)
+
+# The Summary fields the fleet totals read, one array each in the fleet store
+SUMMARY_COLUMNS: Tuple[str, ...] = ("hash_rate_5m", "power", "chip_temperature_maximum")
+
+
+class FleetStore(object):
+    """
+    Struct of arrays holding the summary numbers the totals need of every
+    fleet member, one contiguous array of doubles per field with a row per
+    miner. Fleet wide figures read a column instead of walking a thousand
+    objects. Rows of miners that are offline or failed hold NaN. The members
+    keep their own OnlineMinerData for their entities, this is a copy.
+    """
+
+    def __init__(self):
+        self.rows: Dict[str, int] = {}
+        self.columns: Dict[str, array] = {name: array("d") for name in SUMMARY_COLUMNS}
+        self._free: List[int] = []
+
+    def _row(self, entry_id: str) -> int:
+        row = self.rows.get(entry_id)
+        if row is None:
+            if self._free:
+                row = self._free.pop()
+            else:
+                row = len(self.rows)
+                for column in self.columns.values():
+                    column.append(math.nan)
+            self.rows[entry_id] = row
+        return row
+
+    def write(self, entry_id: str, data: MinerData) -> None:
+        row = self._row(entry_id)
+        summary = data.summary if isinstance(data, OnlineMinerData) else None
+        for name, column in self.columns.items():
+            column[row] = math.nan if summary is None else getattr(summary, name)
+
+    def clear(self, entry_id: str) -> None:
+        """Marks the row of a miner whose poll failed."""
+        row = self.rows.get(entry_id)
+        if row is not None:
+            for column in self.columns.values():
+                column[row] = math.nan
+
+    def remove(self, entry_id: str) -> None:
+        self.clear(entry_id)
+        row = self.rows.pop(entry_id, None)
+        if row is not None:
+            self._free.append(row)
+
+    def values(self, name: str) -> List[float]:
+        """The values of a column for the miners online in the last poll."""
+        return [value for value in self.columns[name] if not math.isnan(value)]
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class FleetTotals(object):
+    """Fleet wide figures over the miners that sent a summary in the last poll."""
+    miners: int
+    # TH/s, from the 5 minute hash rates
+    hash_rate: float
+    power: float
+    # J/TH, None while nothing hashes
+    efficiency: Optional[float]
+    # Distribution of the hottest chip of every miner
+    chip_temperature_p50: Optional[float]
+    chip_temperature_p95: Optional[float]
+    chip_temperature_maximum: Optional[float]
+
+
+def _totals(
+        miners: int, hash_rate: float, power: float,
+        p50: Optional[float], p95: Optional[float], maximum: Optional[float]
+) -> FleetTotals:
+    hash_rate /= 1000
+    return FleetTotals(
+        miners=miners,
+        hash_rate=hash_rate,
+        power=power,
+        efficiency=power / hash_rate if hash_rate > 0 else None,
+        chip_temperature_p50=p50,
+        chip_temperature_p95=p95,
+        chip_temperature_maximum=maximum,
+    )
+
+
+def _percentile(ordered: List[float], percent: float) -> float:
+    """Interpolates between the closest ranks, like numpy.percentile does."""
+    position = (len(ordered) - 1) * percent / 100
+    lower = math.floor(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _python_totals(store: FleetStore) -> FleetTotals:
+    temperatures = sorted(store.values("chip_temperature_maximum"))
+    if not temperatures:
+        return _totals(0, 0.0, 0.0, None, None, None)
+    return _totals(
+        len(temperatures),
+        math.fsum(store.values("hash_rate_5m")),
+        math.fsum(store.values("power")),
+        _percentile(temperatures, 50),
+        _percentile(temperatures, 95),
+        temperatures[-1],
+    )
+
+
+def _load_numpy_totals() -> Optional[Callable[[FleetStore], FleetTotals]]:
+    """NumPy is optional, the columns are read through the buffer protocol without copies."""
+    try:
+        numpy = importlib.import_module("numpy")
+    except ImportError:
+        return None
+
+    def column(store: FleetStore, name: str) -> Any:
+        return numpy.frombuffer(store.columns[name], dtype=numpy.float64)
+
+    def numpy_totals(store: FleetStore) -> FleetTotals:
+        # A row is written whole, so a miner without summary is NaN in every column
+        online = ~numpy.isnan(column(store, "chip_temperature_maximum"))
+        miners = int(numpy.count_nonzero(online))
+        if not miners:
+            return _totals(0, 0.0, 0.0, None, None, None)
+        temperatures = column(store, "chip_temperature_maximum")[online]
+        p50, p95 = numpy.percentile(temperatures, (50, 95))
+        return _totals(
+            miners,
+            float(column(store, "hash_rate_5m")[online].sum()),
+            float(column(store, "power")[online].sum()),
+            float(p50),
+            float(p95),
+            float(temperatures.max()),
+        )
+
+    return numpy_totals
+
+
+TOTALS_BACKENDS: Dict[str, Callable[[FleetStore], FleetTotals]] = {"python": _python_totals}
+_numpy_totals = _load_numpy_totals()
+if _numpy_totals is not None:
+    TOTALS_BACKENDS["numpy"] = _numpy_totals
+fleet_totals = TOTALS_BACKENDS.get("numpy", _python_totals)
+
+
+class WhatsminerFleetCoordinator(DataUpdateCoordinator[Dict[str, MinerData]]):
+    """
+    Polls all registered miners in one cycle and publishes a snapshot keyed by
+    config entry id. Every machine of the fleet shares one connection limiter, so
+    the number of open sockets stays bounded no matter how many miners are added.
+    """
+
+    def __init__(self, hass: HomeAssistant, max_connections: int = FLEET_MAX_CONNECTIONS):
+        super(WhatsminerFleetCoordinator, self).__init__(
+            hass,
+            _LOGGER,
+            name=f"{DOMAIN} fleet",
+            update_method=self.async_fetch,
+            update_interval=UPDATE_INTERVAL,
+        )
+        self.connection_limiter = asyncio.Semaphore(max_connections)
+        self.members: Dict[str, WhatsminerCoordinator] = {}
+        self.errors: Dict[str, BaseException] = {}
+        self.store = FleetStore()
+        self.totals: Optional[FleetTotals] = None
+        # Entry whose sensor platform hosts the fleet entities
+        self.owner: Optional[str] = None
+        self._unsubscribe: Dict[str, CALLBACK_TYPE] = {}
+        # The sensor platform of every member set up, and how to create the
+        # fleet entities for whichever of them hosts them
+        self._add_entities: Dict[str, AddEntitiesCallback] = {}
+        self._create_entities: Optional[Callable[[], List[Entity]]] = None
+
+    @callback
+    def async_register(self, coordinator: WhatsminerCoordinator) -> None:
+        self.members[coordinator.entry_id] = coordinator
+        remove_listener = self.async_add_listener(coordinator.async_handle_fleet_update)
+        # The fleet totals need every member's summary, whichever of its own
+        # sensors are enabled
+        unsubscribe_summary = coordinator.async_subscribe(("summary",))
+
+        @callback
+        def unsubscribe() -> None:
+            remove_listener()
+            unsubscribe_summary()
+
+        self._unsubscribe[coordinator.entry_id] = unsubscribe
+
+    @callback
+    def async_add_platform(
+            self,
+            entry_id: str,
+            add_entities: AddEntitiesCallback,
+            create_entities: Callable[[], List[Entity]],
+    ) -> None:
+        """
+        Keeps the sensor platform of a member. The first member set up hosts the
+        fleet entities, once it is unloaded they are handed to another member.
+        """
+        self._add_entities[entry_id] = add_entities
+        self._create_entities = create_entities
+        if self.owner is None:
+            self._async_host_entities(entry_id)
+
+    @callback
+    def _async_host_entities(self, entry_id: str) -> None:
+        self.owner = entry_id
+        # Only the fleet entities move, the other entities of the member stay
+        self._add_entities[entry_id](self._create_entities())
+
+    @callback
+    def async_unregister(self, entry_id: str) -> None:
+        self.members.pop(entry_id, None)
+        self.errors.pop(entry_id, None)
+        self.store.remove(entry_id)
+        unsubscribe = self._unsubscribe.pop(entry_id, None)
+        if unsubscribe is not None:
+            unsubscribe()
+        self._add_entities.pop(entry_id, None)
+        if self.owner == entry_id:
+            # The fleet entities were removed along with the platform of the owner.
+            # Without another platform, the next member set up takes them.
+            self.owner = None
+            successor = next(iter(self._add_entities), None)
+            if successor is not None:
+                self._async_host_entities(successor)
+
+    async def async_fetch(self) -> Dict[str, MinerData]:
+        members = list(self.members.items())
+        results = await asyncio.gather(
+            *(member.async_fetch() for _, member in members), return_exceptions=True
+        )
+
+        snapshot: Dict[str, MinerData] = {}
+        errors: Dict[str, BaseException] = {}
+        for (entry_id, _), result in zip(members, results):
+            if entry_id not in self.members:
+                # Unregistered while its poll was running
+                continue
+            if isinstance(result, BaseException):
+                errors[entry_id] = result
+                self.store.clear(entry_id)
+            else:
+                snapshot[entry_id] = result
+                self.store.write(entry_id, result)
+        self.errors = errors
+        # One pass over the store columns per cycle, however many miners
+        self.totals = fleet_totals(self.store)
+        _LOGGER.debug(
+            "Polled %d miners, %d failed", len(members), len(errors)
+        )
+        return snapshot
@@ -1,7 +1,7 @@
 import dataclasses
 from datetime import datetime, date
 from decimal import Decimal
-from typing import Callable, Optional, Union, Tuple
+from typing import Any, Callable, Dict, Iterable, Optional, Union, Tuple
 
 from homeassistant.components.sensor import (
     SensorEntity,
@@ -11,21 +11,28 @@ from homeassistant.components.sensor import (
 )
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import (
+    PERCENTAGE,
     FREQUENCY_MEGAHERTZ,
     TEMP_CELSIUS,
     FREQUENCY_HERTZ,
     POWER_WATT,
+    TIME_MILLISECONDS,
     TIME_SECONDS,
 )
 from homeassistant.core import HomeAssistant
-from homeassistant.helpers.entity import EntityCategory
+from homeassistant.helpers.device_registry import DeviceEntryType
+from homeassistant.helpers.entity import DeviceInfo, EntityCategory
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.typing import StateType
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
 from . import WhatsminerCoordinator
+from .aggregation import WindowStats
+from .api import MachineStats
 from .const import DOMAIN, COORDINATOR
-from .coordinator import OnlineMinerData
-from .entity import OnlineWhatsminerEntity
+from .coordinator import OnlineMinerData, READING_FIELDS
+from .entity import OnlineWhatsminerEntity, WhatsminerEntity
+from .fleet import FleetTotals, WhatsminerFleetCoordinator
 
 
 @dataclasses.dataclass
@@ -33,6 +40,26 @@ class WhatsminerSensorEntityDescription(SensorEntityDescription):
     value: Optional[Callable[
         [OnlineMinerData], Union[StateType, date, datetime, Decimal]
     ]] = None
+    # The state is only written once the value moved by more than the absolute
+    # deadband, or deadband_percent of the value last written
+    deadband: Optional[float] = None
+    deadband_percent: Optional[float] = None
+    # Commands the value is read from, polled only while a sensor needs them
+    commands: Tuple[str, ...] = ("summary",)
+
+
+def _derived(name: str) -> Callable[[OnlineMinerData], StateType]:
+    return lambda x: getattr(x.derived, name) if x.derived is not None else None
+
+
+@dataclasses.dataclass
+class WhatsminerStatsSensorEntityDescription(SensorEntityDescription):
+    value: Optional[Callable[[MachineStats], StateType]] = None
+
+
+@dataclasses.dataclass
+class WhatsminerFleetSensorEntityDescription(SensorEntityDescription):
+    value: Optional[Callable[[FleetTotals], StateType]] = None
 
 
 SENSOR_TYPES: Tuple[WhatsminerSensorEntityDescription, ...] = (
@@ -43,6 +70,7 @@ SENSOR_TYPES: Tuple[WhatsminerSensorEntityDescription, ...] = (
         state_class=SensorStateClass.MEASUREMENT,
         device_class=SensorDeviceClass.FREQUENCY,
         entity_category=EntityCategory.DIAGNOSTIC,
+        deadband_percent=1.0,
         value=lambda x: x.summary.average_hash_rate,
     ),
     WhatsminerSensorEntityDescription(
@@ -52,6 +80,7 @@ SENSOR_TYPES: Tuple[WhatsminerSensorEntityDescription, ...] = (
         state_class=SensorStateClass.MEASUREMENT,
         device_class=SensorDeviceClass.FREQUENCY,
         entity_category=EntityCategory.DIAGNOSTIC,
+        deadband_percent=1.0,
         value=lambda x: x.summary.hash_rate_5m,
     ),
     WhatsminerSensorEntityDescription(
@@ -61,6 +90,7 @@ SENSOR_TYPES: Tuple[WhatsminerSensorEntityDescription, ...] = (
         state_class=SensorStateClass.MEASUREMENT,
         device_class=SensorDeviceClass.FREQUENCY,
         entity_category=EntityCategory.DIAGNOSTIC,
+        deadband_percent=1.0,
         value=lambda x: x.summary.hash_rate_1m,
     ),
     WhatsminerSensorEntityDescription(
@@ -70,8 +100,20 @@ SENSOR_TYPES: Tuple[WhatsminerSensorEntityDescription, ...] = (
         state_class=SensorStateClass.MEASUREMENT,
         device_class=SensorDeviceClass.FREQUENCY,
         entity_category=EntityCategory.DIAGNOSTIC,
+        deadband_percent=1.0,
         value=lambda x: x.summary.hash_rate_15m,
     ),
+    WhatsminerSensorEntityDescription(
+        key="hash_rate_ewma",
+        name="Hash Rate (moving average)",
+        native_unit_of_measurement="GH/s",
+        suggested_display_precision=0,
+        state_class=SensorStateClass.MEASUREMENT,
+        device_class=SensorDeviceClass.FREQUENCY,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        deadband_percent=1.0,
+        value=_derived("hash_rate_average"),
+    ),
     WhatsminerSensorEntityDescription(
         key="hash_rate_target",
         name="Target Hash Rate",
@@ -88,6 +130,7 @@ SENSOR_TYPES: Tuple[WhatsminerSensorEntityDescription, ...] = (
         state_class=SensorStateClass.MEASUREMENT,
         device_class=SensorDeviceClass.FREQUENCY,
         entity_category=EntityCategory.DIAGNOSTIC,
+        deadband_percent=1.0,
         value=lambda x: x.summary.average_frequency,
     ),
     WhatsminerSensorEntityDescription(
@@ -106,6 +149,7 @@ SENSOR_TYPES: Tuple[WhatsminerSensorEntityDescription, ...] = (
         state_class=SensorStateClass.MEASUREMENT,
         device_class=SensorDeviceClass.TEMPERATURE,
         entity_category=EntityCategory.DIAGNOSTIC,
+        deadband=0.5,
         value=lambda x: x.summary.chip_temperature_minimum,
     ),
     WhatsminerSensorEntityDescription(
@@ -115,6 +159,7 @@ SENSOR_TYPES: Tuple[WhatsminerSensorEntityDescription, ...] = (
         state_class=SensorStateClass.MEASUREMENT,
         device_class=SensorDeviceClass.TEMPERATURE,
         entity_category=EntityCategory.DIAGNOSTIC,
+        deadband=0.5,
         value=lambda x: x.summary.chip_temperature_maximum,
     ),
     WhatsminerSensorEntityDescription(
@@ -124,6 +169,7 @@ SENSOR_TYPES: Tuple[WhatsminerSensorEntityDescription, ...] = (
         state_class=SensorStateClass.MEASUREMENT,
         device_class=SensorDeviceClass.TEMPERATURE,
         entity_category=EntityCategory.DIAGNOSTIC,
+        deadband=0.5,
         value=lambda x: x.summary.chip_temperature_average,
     ),
     WhatsminerSensorEntityDescription(
@@ -133,8 +179,20 @@ SENSOR_TYPES: Tuple[WhatsminerSensorEntityDescription, ...] = (
         state_class=SensorStateClass.MEASUREMENT,
         device_class=SensorDeviceClass.TEMPERATURE,
         entity_category=EntityCategory.DIAGNOSTIC,
+        deadband=0.5,
         value=lambda x: x.summary.temperature,
     ),
+    WhatsminerSensorEntityDescription(
+        key="temperature_device_ewma",
+        name="Device Temperature (moving average)",
+        native_unit_of_measurement=TEMP_CELSIUS,
+        suggested_display_precision=1,
+        state_class=SensorStateClass.MEASUREMENT,
+        device_class=SensorDeviceClass.TEMPERATURE,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        deadband=0.5,
+        value=_derived("temperature_average"),
+    ),
     WhatsminerSensorEntityDescription(
         key="temperature_environment",
         name="Environment Temperature",
@@ -142,6 +200,7 @@ SENSOR_TYPES: Tuple[WhatsminerSensorEntityDescription, ...] = (
         state_class=SensorStateClass.MEASUREMENT,
         device_class=SensorDeviceClass.TEMPERATURE,
         entity_category=EntityCategory.DIAGNOSTIC,
+        deadband=0.5,
         value=lambda x: x.summary.environment_temperature,
     ),
     WhatsminerSensorEntityDescription(
@@ -152,6 +211,7 @@ SENSOR_TYPES: Tuple[WhatsminerSensorEntityDescription, ...] = (
         device_class=SensorDeviceClass.FREQUENCY,
         entity_category=EntityCategory.DIAGNOSTIC,
         icon="mdi:fan",
+        deadband_percent=1.0,
         value=lambda x: x.summary.fan_speed_in,
     ),
     WhatsminerSensorEntityDescription(
@@ -162,6 +222,7 @@ SENSOR_TYPES: Tuple[WhatsminerSensorEntityDescription, ...] = (
         device_class=SensorDeviceClass.FREQUENCY,
         entity_category=EntityCategory.DIAGNOSTIC,
         icon="mdi:fan",
+        deadband_percent=1.0,
         value=lambda x: x.summary.fan_speed_out,
     ),
     # WhatsminerSensorEntityDescription(
@@ -182,6 +243,17 @@ SENSOR_TYPES: Tuple[WhatsminerSensorEntityDescription, ...] = (
         entity_category=EntityCategory.DIAGNOSTIC,
         value=lambda x: x.summary.power,
     ),
+    WhatsminerSensorEntityDescription(
+        key="efficiency",
+        name="Efficiency",
+        native_unit_of_measurement="W/TH",
+        suggested_display_precision=1,
+        state_class=SensorStateClass.MEASUREMENT,
+        icon="mdi:lightning-bolt-outline",
+        entity_category=EntityCategory.DIAGNOSTIC,
+        deadband_percent=1.0,
+        value=_derived("efficiency"),
+    ),
     WhatsminerSensorEntityDescription(
         key="power_rate",
         name="Power Rate",
@@ -202,6 +274,7 @@ SENSOR_TYPES: Tuple[WhatsminerSensorEntityDescription, ...] = (
         state_class=SensorStateClass.TOTAL_INCREASING,
         device_class=SensorDeviceClass.DURATION,
         entity_category=EntityCategory.DIAGNOSTIC,
+        deadband=60,
         value=lambda x: x.summary.uptime,
     ),
     WhatsminerSensorEntityDescription(
@@ -218,6 +291,16 @@ SENSOR_TYPES: Tuple[WhatsminerSensorEntityDescription, ...] = (
         entity_category=EntityCategory.DIAGNOSTIC,
         value=lambda x: x.summary.rejected,
     ),
+    WhatsminerSensorEntityDescription(
+        key="acceptance_rate",
+        name="Share Acceptance",
+        native_unit_of_measurement=PERCENTAGE,
+        suggested_display_precision=2,
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        deadband=0.01,
+        value=_derived("acceptance_rate"),
+    ),
     WhatsminerSensorEntityDescription(
         key="rejected_percent",
         name="Rejected Percent",
@@ -235,15 +318,145 @@ SENSOR_TYPES: Tuple[WhatsminerSensorEntityDescription, ...] = (
 )
 
 
+STATS_SENSOR_TYPES: Tuple[WhatsminerStatsSensorEntityDescription, ...] = (
+    WhatsminerStatsSensorEntityDescription(
+        key="connect_time_p95",
+        name="Connect Time (95th percentile)",
+        native_unit_of_measurement=TIME_MILLISECONDS,
+        suggested_display_precision=1,
+        state_class=SensorStateClass.MEASUREMENT,
+        device_class=SensorDeviceClass.DURATION,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+        value=lambda x: x.total().connect.percentile(95),
+    ),
+    WhatsminerStatsSensorEntityDescription(
+        key="round_trip_p95",
+        name="Round Trip Time (95th percentile)",
+        native_unit_of_measurement=TIME_MILLISECONDS,
+        suggested_display_precision=1,
+        state_class=SensorStateClass.MEASUREMENT,
+        device_class=SensorDeviceClass.DURATION,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+        value=lambda x: x.total().round_trip.percentile(95),
+    ),
+    WhatsminerStatsSensorEntityDescription(
+        key="token_derivation",
+        name="Token Derivation Time",
+        native_unit_of_measurement=TIME_MILLISECONDS,
+        suggested_display_precision=1,
+        state_class=SensorStateClass.MEASUREMENT,
+        device_class=SensorDeviceClass.DURATION,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+        value=lambda x: x.commands["get_token"].decode.mean if "get_token" in x.commands else None,
+    ),
+    WhatsminerStatsSensorEntityDescription(
+        key="slowest_command",
+        name="Slowest Command",
+        icon="mdi:timer-sand",
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+        value=lambda x: x.slowest(),
+    ),
+    WhatsminerStatsSensorEntityDescription(
+        key="request_errors",
+        name="Request Errors",
+        icon="mdi:alert-circle-outline",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+        value=lambda x: sum(x.total().errors.values()),
+    ),
+)
+
+
+FLEET_SENSOR_TYPES: Tuple[WhatsminerFleetSensorEntityDescription, ...] = (
+    WhatsminerFleetSensorEntityDescription(
+        key="miners_online",
+        name="Miners Online",
+        icon="mdi:server-network",
+        state_class=SensorStateClass.MEASUREMENT,
+        value=lambda x: x.miners,
+    ),
+    WhatsminerFleetSensorEntityDescription(
+        key="hash_rate",
+        name="Hash Rate",
+        native_unit_of_measurement="TH/s",
+        suggested_display_precision=2,
+        state_class=SensorStateClass.MEASUREMENT,
+        value=lambda x: x.hash_rate,
+    ),
+    WhatsminerFleetSensorEntityDescription(
+        key="power",
+        name="Power Usage",
+        native_unit_of_measurement=POWER_WATT,
+        state_class=SensorStateClass.MEASUREMENT,
+        device_class=SensorDeviceClass.POWER,
+        value=lambda x: x.power,
+    ),
+    WhatsminerFleetSensorEntityDescription(
+        key="efficiency",
+        name="Efficiency",
+        native_unit_of_measurement="J/TH",
+        suggested_display_precision=1,
+        state_class=SensorStateClass.MEASUREMENT,
+        icon="mdi:lightning-bolt-outline",
+        value=lambda x: x.efficiency,
+    ),
+    WhatsminerFleetSensorEntityDescription(
+        key="chip_temperature_p50",
+        name="Chip Temperature (median)",
+        native_unit_of_measurement=TEMP_CELSIUS,
+        suggested_display_precision=1,
+        state_class=SensorStateClass.MEASUREMENT,
+        device_class=SensorDeviceClass.TEMPERATURE,
+        value=lambda x: x.chip_temperature_p50,
+    ),
+    WhatsminerFleetSensorEntityDescription(
+        key="chip_temperature_p95",
+        name="Chip Temperature (95th percentile)",
+        native_unit_of_measurement=TEMP_CELSIUS,
+        suggested_display_precision=1,
+        state_class=SensorStateClass.MEASUREMENT,
+        device_class=SensorDeviceClass.TEMPERATURE,
+        value=lambda x: x.chip_temperature_p95,
+    ),
+    WhatsminerFleetSensorEntityDescription(
+        key="chip_temperature_maximum",
+        name="Chip Temperature (maximum)",
+        native_unit_of_measurement=TEMP_CELSIUS,
+        suggested_display_precision=1,
+        state_class=SensorStateClass.MEASUREMENT,
+        device_class=SensorDeviceClass.TEMPERATURE,
+        value=lambda x: x.chip_temperature_maximum,
+    ),
+)
+
+
 async def async_setup_entry(
     hass: HomeAssistant, entry: ConfigEntry, async_add_entities: AddEntitiesCallback
 ) -> None:
     coordinator: WhatsminerCoordinator = hass.data[DOMAIN][entry.entry_id][COORDINATOR]
-
     async_add_entities(
         [WhatsminerSensor(coordinator, description) for description in SENSOR_TYPES]
+        + [
+            WhatsminerStatsSensor(coordinator, description)
+            for description in STATS_SENSOR_TYPES
+        ]
     )
 
+    fleet = coordinator.fleet
+    if fleet is not None:
+        fleet.async_add_platform(
+            entry.entry_id,
+            async_add_entities,
+            lambda: [
+                WhatsminerFleetSensor(fleet, description) for description in FLEET_SENSOR_TYPES
+            ],
+        )
+
 
 class WhatsminerSensor(OnlineWhatsminerEntity, SensorEntity):
     def __init__(
@@ -255,8 +468,123 @@ class WhatsminerSensor(OnlineWhatsminerEntity, SensorEntity):
         self.entity_description: WhatsminerSensorEntityDescription = entity_description
         self._attr_unique_id = f"{coordinator.device_mac}_{entity_description.key}"
 
+    def _commands(self) -> Iterable[str]:
+        return self.entity_description.commands
+
+    @property
+    def available(self) -> bool:
+        # A newly enabled sensor waits for the first reply of its commands
+        return super(WhatsminerSensor, self).available and all(
+            getattr(self.coordinator.data, READING_FIELDS[command]) is not None
+            for command in self.entity_description.commands
+            if command in READING_FIELDS
+        )
+
+    @property
+    def _aggregated(self) -> bool:
+        return (
+            self.coordinator.aggregator is not None
+            and self.entity_description.state_class == SensorStateClass.MEASUREMENT
+        )
+
+    async def async_added_to_hass(self) -> None:
+        await super(WhatsminerSensor, self).async_added_to_hass()
+        if self._aggregated:
+            self.async_on_remove(self.coordinator.aggregator.async_track(
+                self.entity_description.key, self.entity_description.value
+            ))
+
+    def _window(self) -> Optional[WindowStats]:
+        if not self._aggregated:
+            return None
+        return self.coordinator.aggregator.published.get(self.entity_description.key)
+
     @property
     def native_value(self) -> Union[StateType, date, datetime, Decimal]:
         if not isinstance(self.coordinator.data, OnlineMinerData):
             return None
+        # Aggregated sensors show the mean of the last window once there is one
+        window = self._window()
+        if window is not None:
+            return window.mean
         return self.entity_description.value(self.coordinator.data)
+
+    @property
+    def extra_state_attributes(self) -> Optional[Dict[str, Any]]:
+        window = self._window()
+        if window is None:
+            return None
+        return {
+            "minimum": window.minimum,
+            "maximum": window.maximum,
+            "samples": window.samples,
+        }
+
+    def _tracked_value(self) -> Union[StateType, date, datetime, Decimal, WindowStats]:
+        # A published window is written once, whatever its mean
+        return self._window() or self.native_value
+
+    def _value_changed(self, written, value) -> bool:
+        description = self.entity_description
+        if (
+                not isinstance(written, (int, float))
+                or not isinstance(value, (int, float))
+                or (description.deadband is None and description.deadband_percent is None)
+        ):
+            return written != value
+        threshold = max(
+            description.deadband or 0,
+            abs(written) * (description.deadband_percent or 0) / 100,
+        )
+        return abs(value - written) > threshold if threshold else written != value
+
+
+class WhatsminerStatsSensor(WhatsminerEntity, SensorEntity):
+    """Request statistics of the machine, available while the miner is offline too."""
+
+    def __init__(
+        self,
+        coordinator: WhatsminerCoordinator,
+        entity_description: WhatsminerStatsSensorEntityDescription,
+    ):
+        super(WhatsminerStatsSensor, self).__init__(coordinator)
+        self.entity_description: WhatsminerStatsSensorEntityDescription = entity_description
+        self._attr_unique_id = f"{coordinator.device_mac}_{entity_description.key}"
+
+    @property
+    def native_value(self) -> StateType:
+        return self.entity_description.value(self.coordinator.machine.stats)
+
+    def _tracked_value(self) -> StateType:
+        return self.native_value
+
+
+class WhatsminerFleetSensor(CoordinatorEntity[WhatsminerFleetCoordinator], SensorEntity):
+    """Totals over all fleet miners, on a device of their own."""
+
+    _attr_has_entity_name = True
+
+    def __init__(
+        self,
+        coordinator: WhatsminerFleetCoordinator,
+        entity_description: WhatsminerFleetSensorEntityDescription,
+    ):
+        super(WhatsminerFleetSensor, self).__init__(coordinator)
+        self.entity_description: WhatsminerFleetSensorEntityDescription = entity_description
+        self._attr_unique_id = f"fleet_{entity_description.key}"
+        self._attr_device_info = DeviceInfo(
+            identifiers={(DOMAIN, "fleet")},
+            name="Whatsminer Fleet",
+            manufacturer="Whatsminer",
+            entry_type=DeviceEntryType.SERVICE,
+        )
+
+    @property
+    def available(self) -> bool:
+        return super(WhatsminerFleetSensor, self).available and self.native_value is not None
+
+    @property
+    def native_value(self) -> StateType:
+        if self.coordinator.totals is None:
+            return None
+        return self.entity_description.value(self.coordinator.totals)
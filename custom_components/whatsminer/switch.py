@@ -1,5 +1,5 @@
 import logging
-from typing import Tuple
+from typing import Iterable, Tuple
 
 from homeassistant.components.switch import (
     SwitchEntity,
@@ -48,6 +48,12 @@ class MinerSwitch(WhatsminerEntity, SwitchEntity):
     def is_on(self) -> bool:
         return isinstance(self.coordinator.data, OnlineMinerData)
 
+    def _commands(self) -> Iterable[str]:
+        return ("status",)
+
+    def _tracked_value(self) -> bool:
+        return self.is_on
+
     def turn_on(self) -> None:
         raise NotImplementedError
 
@@ -56,9 +62,16 @@ class MinerSwitch(WhatsminerEntity, SwitchEntity):
 
     async def async_turn_on(self) -> None:
         await self.coordinator.api.power_on_miner()
+        await self._async_refresh_status()
 
     async def async_turn_off(self) -> None:
         await self.coordinator.api.power_off_miner()
+        await self._async_refresh_status()
+
+    async def _async_refresh_status(self) -> None:
+        # The status is otherwise only read again once its period passed
+        self.coordinator.schedule.expire("status")
+        await self.coordinator.async_request_refresh()
 
     async def restart_miner(self) -> None:
         await self.coordinator.api.restart_miner()
@@ -0,0 +1,74 @@
+"""
+Shared fixtures. Tests of coroutines run them with asyncio.run, the miners
+they talk to are the simulated ones of tools/simulator.py.
+"""
+import contextlib
+import dataclasses
+import os
+import socket
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tools"))
+
+import simulator  # noqa: E402
+
+from custom_components.whatsminer.api import Summary, Version  # noqa: E402
+from custom_components.whatsminer.coordinator import OnlineMinerData  # noqa: E402
+
+# Zero, empty or false in every field
+SUMMARY = Summary(**{
+    field.name: "" if field.type is str else False if field.type is bool else 0
+    for field in dataclasses.fields(Summary)
+})
+
+
+def _free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+@pytest.fixture
+def simulate():
+    """
+    Starts simulated miners in the running event loop, e.g.
+    async with simulate(api_version="whatsminer v1.4.0") as miners: ...
+    """
+
+    @contextlib.asynccontextmanager
+    async def simulate(count: int = 1, **options):
+        miners = simulator.Simulator()
+        await miners.start(count, base_port=_free_port(), **options)
+        try:
+            yield miners
+        finally:
+            await miners.stop()
+
+    return simulate
+
+
+@pytest.fixture
+def summary():
+    """Builds a summary, e.g. summary(power=3400), zero where not given."""
+
+    def summary(**values) -> Summary:
+        return dataclasses.replace(SUMMARY, **values)
+
+    return summary
+
+
+@pytest.fixture
+def online_data():
+    """Builds the data of an online miner, e.g. online_data(temperature=70)."""
+
+    def online_data(**summary) -> OnlineMinerData:
+        return OnlineMinerData(
+            "M30S",
+            summary=dataclasses.replace(SUMMARY, **summary),
+            power_unit=None,
+            version=Version("2.0.5", ""),
+        )
+
+    return online_data
@@ -0,0 +1,66 @@
+from custom_components.whatsminer.aggregation import Aggregator, RingBuffer, WindowStats
+from custom_components.whatsminer.coordinator import OnlineMinerData
+
+
+def _temperature(data: OnlineMinerData) -> float:
+    return data.summary.temperature
+
+
+def test_ring_buffer_keeps_the_last_samples():
+    buffer = RingBuffer(3)
+    assert buffer.stats() is None
+    for value in (1, 2, 3, 4):
+        buffer.add(value)
+
+    assert buffer.stats() == WindowStats(minimum=2, mean=3, maximum=4, samples=3)
+
+
+def test_aggregator_publishes_once_per_window(online_data):
+    aggregator = Aggregator(3)
+    aggregator.async_track("temperature", _temperature)
+
+    aggregator.add(online_data(temperature=70))
+    aggregator.add(online_data(temperature=71))
+    assert aggregator.published == {}
+
+    aggregator.add(online_data(temperature=75))
+    assert aggregator.published == {
+        "temperature": WindowStats(minimum=70, mean=72, maximum=75, samples=3)
+    }
+
+    # Kept until the next window closes
+    aggregator.add(online_data(temperature=60))
+    assert aggregator.published["temperature"].maximum == 75
+
+
+def test_aggregator_skips_missing_samples(online_data):
+    aggregator = Aggregator(2)
+    aggregator.async_track("temperature", lambda data: None)
+
+    aggregator.add(online_data(temperature=70))
+    aggregator.add(online_data(temperature=71))
+    assert aggregator.published == {}
+
+
+def test_aggregator_reset_drops_the_window(online_data):
+    aggregator = Aggregator(2)
+    aggregator.async_track("temperature", _temperature)
+    aggregator.add(online_data(temperature=70))
+    aggregator.reset()
+
+    aggregator.add(online_data(temperature=80))
+    assert aggregator.published == {}
+    aggregator.add(online_data(temperature=90))
+    assert aggregator.published["temperature"].samples == 2
+    assert aggregator.published["temperature"].mean == 85
+
+
+def test_aggregator_untrack(online_data):
+    aggregator = Aggregator(1)
+    untrack = aggregator.async_track("temperature", _temperature)
+    aggregator.add(online_data(temperature=70))
+    untrack()
+
+    assert aggregator.published == {}
+    aggregator.add(online_data(temperature=80))
+    assert aggregator.published == {}
@@ -0,0 +1,80 @@
+import asyncio
+
+from simulator import Faults
+
+from custom_components.whatsminer.api import CommandError, WhatsminerMachine
+
+
+def test_batch_splits_the_joined_reply(simulate):
+    async def main():
+        async with simulate() as miners:
+            machine = WhatsminerMachine(*miners.addresses[0])
+            responses = await machine.communicate_batch(("summary", "status", "get_version"))
+            return responses, machine, miners.miners[0].requests
+
+    responses, machine, requests = asyncio.run(main())
+    assert responses["summary"]["SUMMARY"][0]["Power"] == 3400
+    assert responses["status"]["Msg"]["btmineroff"] == "false"
+    assert responses["get_version"]["Msg"]["api_ver"] == "2.0.5"
+    assert requests == {"summary+status+get_version": 1}
+    assert machine._batch_supported is True
+
+
+def test_batch_falls_back_to_separate_requests(simulate):
+    async def main():
+        async with simulate(faults=Faults(no_batch=True)) as miners:
+            machine = WhatsminerMachine(*miners.addresses[0])
+            first = await machine.communicate_batch(("summary", "status"))
+            second = await machine.communicate_batch(("summary", "status"))
+            return first, second, machine, miners.miners[0].requests
+
+    first, second, machine, requests = asyncio.run(main())
+    for responses in (first, second):
+        assert set(responses) == {"summary", "status"}
+        assert not any(isinstance(response, BaseException) for response in responses.values())
+    # The rejection is remembered, the second poll does not try joining again
+    assert machine._batch_supported is False
+    assert requests == {"summary+status": 1, "summary": 2, "status": 2}
+
+
+def test_batch_maps_a_failed_part_to_its_exception(simulate):
+    async def main():
+        async with simulate() as miners:
+            miner = miners.miners[0]
+            respond = miner.respond
+
+            def respond_without_status(request):
+                reply = respond(request)
+                reply["status"] = [{"STATUS": "E", "Code": 132, "Msg": "failed"}]
+                return reply
+
+            miner.respond = respond_without_status
+            return await WhatsminerMachine(*miners.addresses[0]).communicate_batch(
+                ("summary", "status")
+            )
+
+    responses = asyncio.run(main())
+    assert isinstance(responses["status"], CommandError)
+    assert "SUMMARY" in responses["summary"]
+
+
+def test_batch_keeps_the_replies_in_time_when_one_is_late(simulate):
+    async def main():
+        async with simulate(faults=Faults(no_batch=True)) as miners:
+            miner = miners.miners[0]
+            read_request = miner._read_request
+
+            async def slow_status(reader):
+                request = await read_request(reader)
+                if request is not None and request.get("cmd") == "status":
+                    await asyncio.sleep(1)
+                return request
+
+            miner._read_request = slow_status
+            return await WhatsminerMachine(*miners.addresses[0]).communicate_batch(
+                ("summary", "status"), timeout=0.2
+            )
+
+    responses = asyncio.run(main())
+    assert isinstance(responses["status"], asyncio.TimeoutError)
+    assert "SUMMARY" in responses["summary"]
@@ -0,0 +1,69 @@
+from custom_components.whatsminer.api import CircuitBreaker
+
+
+def _breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker(initial=5, maximum=60)
+    assert breaker.state == "closed"
+    return breaker
+
+
+def test_breaker_opens_on_failure():
+    breaker = _breaker()
+    breaker.record_failure(100)
+
+    assert breaker.state == "open"
+    assert 102.5 <= breaker.open_until <= 105
+    assert not breaker.allow(100)
+
+
+def test_breaker_lets_one_probe_through_once_the_delay_passed():
+    breaker = _breaker()
+    breaker.record_failure(100)
+
+    assert breaker.allow(breaker.open_until)
+    assert breaker.state == "half_open"
+    # Concurrent requests keep failing fast while the probe is out
+    assert not breaker.allow(breaker.open_until)
+
+
+def test_breaker_closes_when_the_probe_connects():
+    breaker = _breaker()
+    breaker.record_failure(100)
+    breaker.allow(breaker.open_until)
+    breaker.record_success()
+
+    assert breaker.state == "closed"
+    assert breaker.failures == 0
+    assert breaker.allow(0)
+
+
+def test_breaker_backs_off_exponentially_up_to_the_maximum():
+    breaker = _breaker()
+    now = 0.0
+    for failures, delay in enumerate((5, 10, 20, 40, 60, 60), start=1):
+        breaker.allow(breaker.open_until)
+        breaker.record_failure(now)
+        assert breaker.failures == failures
+        assert delay / 2 <= breaker.open_until - now <= delay
+        now = breaker.open_until
+
+
+def test_breaker_ignores_failures_while_open():
+    breaker = _breaker()
+    breaker.record_failure(100)
+    open_until = breaker.open_until
+    # A request sent before the circuit opened
+    breaker.record_failure(101)
+
+    assert breaker.failures == 1
+    assert breaker.open_until == open_until
+
+
+def test_breaker_released_probe_lets_the_next_request_probe():
+    breaker = _breaker()
+    breaker.record_failure(100)
+    breaker.allow(breaker.open_until)
+    breaker.release_probe()
+
+    assert breaker.state == "open"
+    assert breaker.allow(breaker.open_until)
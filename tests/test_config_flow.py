@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from custom_components.whatsminer.config_flow import (
+    TooManyHosts,
+    async_validate_many,
+    parse_hosts,
+)
+from custom_components.whatsminer.const import BULK_MAX_HOSTS
+
+
+def test_parse_hosts_single_hosts():
+    assert parse_hosts("192.168.1.10, miner-2\n10.0.0.1;") == [
+        "192.168.1.10", "miner-2", "10.0.0.1"
+    ]
+
+
+def test_parse_hosts_network_skips_network_and_broadcast_address():
+    assert parse_hosts("192.168.1.0/30") == ["192.168.1.1", "192.168.1.2"]
+
+
+def test_parse_hosts_network_with_host_bits():
+    assert parse_hosts("192.168.1.5/30") == ["192.168.1.5", "192.168.1.6"]
+
+
+def test_parse_hosts_range_includes_both_ends():
+    assert parse_hosts("10.0.0.254-10.0.1.1") == [
+        "10.0.0.254", "10.0.0.255", "10.0.1.0", "10.0.1.1"
+    ]
+
+
+def test_parse_hosts_drops_duplicates_in_order():
+    assert parse_hosts("10.0.0.2 10.0.0.1-10.0.0.3 10.0.0.0/30") == [
+        "10.0.0.2", "10.0.0.1", "10.0.0.3"
+    ]
+
+
+def test_parse_hosts_empty():
+    assert parse_hosts(" \n ") == []
+
+
+@pytest.mark.parametrize("text", ["10.0.0.5-10.0.0.1", "10.0.0.0/33", "10.0.0.300/24"])
+def test_parse_hosts_malformed(text):
+    with pytest.raises(ValueError):
+        parse_hosts(text)
+
+
+@pytest.mark.parametrize("text", [
+    "10.0.0.0/21",
+    f"10.0.0.0-10.0.{BULK_MAX_HOSTS // 256}.0",
+    "10.0.0.0/23 10.0.2.0/23 10.0.4.1-10.0.4.5",
+])
+def test_parse_hosts_too_many(text):
+    with pytest.raises(TooManyHosts):
+        parse_hosts(text)
+
+
+def test_parse_hosts_up_to_the_limit():
+    assert len(parse_hosts("10.0.0.0/23 10.0.2.0/23")) == 1020
+
+
+def test_validate_many_reads_each_miner_or_its_error(simulate):
+    async def main():
+        async with simulate(2, loopback=True) as miners:
+            hosts = [host for host, _ in miners.addresses]
+            port = miners.addresses[0][1]
+            # Nothing listens on this one
+            return await async_validate_many(hosts + ["127.0.0.250"], port, "admin"), miners
+
+    results, miners = asyncio.run(main())
+    for miner, host in zip(miners.miners, miners.addresses):
+        assert results[host[0]]["mac"] == miner.mac.lower()
+        assert results[host[0]]["model"]
+    assert results["127.0.0.250"] == "miner_offline"
+
+
+def test_validate_many_reports_a_wrong_password(simulate):
+    async def main():
+        async with simulate(loopback=True) as miners:
+            host, port = miners.addresses[0]
+            return await async_validate_many([host], port, "wrong"), host
+
+    results, host = asyncio.run(main())
+    assert results == {host: "invalid_auth"}
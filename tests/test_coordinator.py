@@ -0,0 +1,144 @@
+import asyncio
+import time
+
+import pytest
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from homeassistant.helpers.update_coordinator import UpdateFailed
+
+from custom_components.whatsminer.coordinator import (
+    MinerData,
+    OnlineMinerData,
+    WhatsminerCoordinator,
+)
+
+
+def _coordinator(tmp_path, host: str, port: int) -> WhatsminerCoordinator:
+    """Called in the running loop, HA takes it over."""
+    entry = ConfigEntry(
+        version=2,
+        domain="whatsminer",
+        title=host,
+        data={"host": host, "port": port, "password": "admin", "mac": "C4:11:04:00:00:01"},
+        source="user",
+    )
+    coordinator = WhatsminerCoordinator(HomeAssistant(str(tmp_path)), entry)
+    # The entry is not added to HA, nothing to store the detected version in
+    coordinator._async_persist = lambda: None
+    return coordinator
+
+
+def _fail(miner, command: str, code: int) -> None:
+    """Makes the simulated miner answer command with an error, joined or not."""
+    respond = miner.respond
+    error = {"STATUS": "E", "When": 0, "Code": code, "Msg": "failed"}
+
+    def failing(request):
+        reply = respond(request)
+        parts = (request.get("cmd") or "").split("+")
+        if parts == [command]:
+            return error
+        if command in parts and isinstance(reply, dict):
+            reply[command] = [error]
+        return reply
+
+    miner.respond = failing
+
+
+def test_coordinator_reads_only_due_commands(tmp_path, simulate):
+    async def main():
+        async with simulate() as miners:
+            coordinator = _coordinator(tmp_path, *miners.addresses[0])
+            requests = miners.miners[0].requests
+            first = await coordinator.async_fetch()
+            after_first = dict(requests)
+            second = await coordinator.async_fetch()
+            after_second = dict(requests)
+            coordinator.schedule.expire("summary")
+            await coordinator.async_fetch()
+            return first, second, after_first, after_second, dict(requests)
+
+    first, second, after_first, after_second, after_expiry = asyncio.run(main())
+    assert isinstance(first, OnlineMinerData) and first.summary is not None
+    # Nothing was due again, the second poll was served from the last readings
+    assert after_second == after_first
+    assert second.summary == first.summary
+    assert after_expiry == {**after_first, "summary": 1}
+
+
+def test_coordinator_keeps_the_last_reading_of_a_failed_command(tmp_path, simulate):
+    async def main():
+        async with simulate() as miners:
+            coordinator = _coordinator(tmp_path, *miners.addresses[0])
+            first = await coordinator.async_fetch()
+            _fail(miners.miners[0], "summary", 132)
+            coordinator.schedule.expire("summary")
+            second = await coordinator.async_fetch()
+            # Too old to keep any longer
+            coordinator.schedule.mark("summary", time.monotonic() - 3600)
+            coordinator.schedule.expire("summary")
+            with pytest.raises(UpdateFailed):
+                await coordinator.async_fetch()
+            return first, second
+
+    first, second = asyncio.run(main())
+    assert second.stale == {"summary"}
+    assert second.summary == first.summary
+
+
+def test_coordinator_reports_a_powered_off_miner_as_offline(tmp_path, simulate):
+    async def main():
+        async with simulate() as miners:
+            coordinator = _coordinator(tmp_path, *miners.addresses[0])
+            await coordinator.async_fetch()
+            miners.miners[0].mining = False
+            coordinator.schedule.expire("status")
+            data = await coordinator.async_fetch()
+            return data, coordinator.schedule.due(time.monotonic())
+
+    data, due = asyncio.run(main())
+    assert type(data) is MinerData
+    assert data.device_model is not None
+    # Checked again on the next poll
+    assert "status" in due
+
+
+def test_coordinator_stops_connecting_to_an_unreachable_miner(tmp_path, simulate):
+    async def main():
+        async with simulate() as miners:
+            coordinator = _coordinator(tmp_path, *miners.addresses[0])
+            await coordinator.async_fetch()
+        coordinator.schedule.expire("status")
+        first = await coordinator.async_fetch()
+        breaker = coordinator.machine.breaker
+        state, failures = breaker.state, breaker.failures
+        # Fails fast while the circuit is open
+        second = await coordinator.async_fetch()
+        return first, second, state, failures, breaker.failures
+
+    first, second, state, failures, failures_after = asyncio.run(main())
+    assert type(first) is MinerData and type(second) is MinerData
+    assert state == "open"
+    assert failures == failures_after == 1
+
+
+def test_lazy_coordinator_reads_only_subscribed_commands(tmp_path, simulate):
+    async def main():
+        async with simulate() as miners:
+            coordinator = _coordinator(tmp_path, *miners.addresses[0])
+            coordinator.async_enable_lazy_polling()
+            first = await coordinator.async_fetch()
+            read_first = {
+                part for request in miners.miners[0].requests for part in request.split("+")
+            }
+            unsubscribe = coordinator.async_subscribe(["summary"])
+            second = await coordinator.async_fetch()
+            unsubscribe()
+            return first, read_first, second
+
+    first, read_first, second = asyncio.run(main())
+    assert read_first == {"get_version", "status", "devdetails"}
+    assert first.summary is None
+    # Subscribing makes the command due right away
+    assert second.summary is not None
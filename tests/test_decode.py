@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+from simulator import Faults
+
+from custom_components.whatsminer.api import (
+    MinerOffline,
+    WhatsminerMachine,
+    _decode_response,
+    _parse_json,
+)
+
+
+def test_parse_json_reads_bytes():
+    assert _parse_json(b'{"STATUS": "S", "Msg": {"mac": "C4:11"}}') == {
+        "STATUS": "S", "Msg": {"mac": "C4:11"}
+    }
+
+
+def test_parse_json_drops_trailing_commas():
+    assert _parse_json(b'{"Msg": {"a": 1, "b": 2,},}') == {"Msg": {"a": 1, "b": 2}}
+
+
+def test_parse_json_raises_on_other_errors():
+    with pytest.raises(ValueError):
+        _parse_json(b'{"Msg": ')
+
+
+def test_decode_response_maps_the_powered_off_reply():
+    with pytest.raises(MinerOffline):
+        _decode_response(b"Socket connect failed: Connection refused\n")
+
+
+def test_decode_response_raises_on_an_empty_reply():
+    with pytest.raises(ConnectionResetError):
+        _decode_response(b"")
+
+
+def test_reply_with_a_trailing_comma_is_read(simulate):
+    async def main():
+        async with simulate(faults=Faults(trailing_comma=True)) as miners:
+            return await WhatsminerMachine(*miners.addresses[0]).communicate("summary")
+
+    assert asyncio.run(main())["SUMMARY"][0]["Power"] == 3400
@@ -0,0 +1,62 @@
+import math
+
+import pytest
+
+from custom_components.whatsminer.derived import EWMA_TIME_CONSTANT, DerivedTracker
+
+
+def test_first_summary(summary):
+    metrics = DerivedTracker().add(
+        summary(power=3400, hash_rate_5m=100_000, hash_rate_5s=101_000, temperature=70), 0
+    )
+
+    # W/TH from W and GH/s
+    assert metrics.efficiency == pytest.approx(34)
+    # Nothing to compare the share counters with yet
+    assert metrics.acceptance_rate is None
+    assert metrics.hash_rate_average == 101_000
+    assert metrics.temperature_average == 70
+
+
+def test_efficiency_is_none_while_nothing_hashes(summary):
+    assert DerivedTracker().add(summary(power=50), 0).efficiency is None
+
+
+def test_averages_weigh_samples_by_their_age(summary):
+    tracker = DerivedTracker()
+    tracker.add(summary(temperature=70), 0)
+    metrics = tracker.add(summary(temperature=80), EWMA_TIME_CONSTANT)
+
+    assert metrics.temperature_average == pytest.approx(80 - 10 / math.e)
+
+
+def test_acceptance_rate_of_the_shares_since_the_last_summary(summary):
+    tracker = DerivedTracker()
+    tracker.add(summary(accepted=1000, rejected=10), 0)
+    metrics = tracker.add(summary(accepted=1098, rejected=12), 5)
+
+    assert metrics.acceptance_rate == pytest.approx(98)
+
+
+def test_acceptance_rate_skips_a_restart(summary):
+    tracker = DerivedTracker()
+    tracker.add(summary(accepted=1000, rejected=10), 0)
+    tracker.add(summary(accepted=1100, rejected=10), 5)
+    metrics = tracker.add(summary(accepted=3, rejected=1), 10)
+
+    assert metrics.acceptance_rate == 100
+    # Counted from the restarted counters on
+    metrics = tracker.add(summary(accepted=3, rejected=2), 10 + EWMA_TIME_CONSTANT)
+    assert 0 < metrics.acceptance_rate < 100
+
+
+def test_clear_starts_over(summary):
+    tracker = DerivedTracker()
+    tracker.add(summary(accepted=1000, rejected=10, temperature=70), 0)
+    tracker.add(summary(accepted=1100, rejected=10, temperature=70), 5)
+    tracker.clear()
+
+    assert tracker.metrics is None
+    metrics = tracker.add(summary(accepted=1200, rejected=50, temperature=90), 10)
+    assert metrics.acceptance_rate is None
+    assert metrics.temperature_average == 90
@@ -0,0 +1,38 @@
+import asyncio
+
+from custom_components.whatsminer.discovery import _hosts, async_scan
+
+
+def test_hosts_of_a_network():
+    assert list(_hosts(["10.0.0.0/30"])) == ["10.0.0.1", "10.0.0.2"]
+
+
+def test_hosts_of_overlapping_networks_are_yielded_once():
+    hosts = list(_hosts(["10.0.0.0/24", "10.0.0.128/25", "10.0.1.0/24", "10.0.0.5/32"]))
+
+    assert len(hosts) == len(set(hosts))
+    # Adjacent networks merge, so their network and broadcast addresses are hosts too
+    assert len(hosts) == 510
+    assert hosts[0] == "10.0.0.1"
+    assert hosts[-1] == "10.0.1.254"
+
+
+def test_hosts_of_both_ip_versions():
+    assert list(_hosts(["fd00::/126", "192.168.1.7"])) == [
+        "192.168.1.7", "fd00::1", "fd00::2", "fd00::3"
+    ]
+
+
+def test_scan_finds_the_simulated_miners(simulate):
+    async def main():
+        async with simulate(2, loopback=True) as miners:
+            ports = {port for _, port in miners.addresses}
+            assert len(ports) == 1
+            found = await async_scan(
+                [f"{host}/32" for host, _ in miners.addresses], port=ports.pop(), timeout=2
+            )
+            return found, miners.miners
+
+    found, miners = asyncio.run(main())
+    assert sorted(miner.mac for miner in found) == sorted(miner.mac.lower() for miner in miners)
+    assert all(miner.model for miner in found)
@@ -0,0 +1,86 @@
+import math
+
+import pytest
+
+from custom_components.whatsminer.api import Version
+from custom_components.whatsminer.coordinator import MinerData, OnlineMinerData
+from custom_components.whatsminer.fleet import TOTALS_BACKENDS, FleetStore
+
+
+@pytest.fixture
+def online(online_data):
+    def online(hash_rate_5m: float, power: float, chip_temperature_maximum: float):
+        return online_data(
+            hash_rate_5m=hash_rate_5m, power=power, chip_temperature_maximum=chip_temperature_maximum
+        )
+
+    return online
+
+
+def test_store_offline_miners_hold_nan(online):
+    store = FleetStore()
+    store.write("a", online(100_000, 3300, 80))
+    store.write("b", MinerData("M30S"))
+
+    assert store.values("power") == [3300]
+    assert math.isnan(store.columns["power"][store.rows["b"]])
+
+
+def test_store_summary_without_subscribers_holds_nan():
+    store = FleetStore()
+    store.write("a", OnlineMinerData("M30S", None, None, Version("2.0.5", "")))
+
+    assert store.values("power") == []
+
+
+def test_store_clear_marks_the_row_failed(online):
+    store = FleetStore()
+    store.write("a", online(100_000, 3300, 80))
+    store.write("b", online(100_000, 3400, 82))
+    store.clear("b")
+
+    assert store.values("power") == [3300]
+    # Clearing an unknown miner is a no-op
+    store.clear("c")
+
+
+def test_store_reuses_rows_of_removed_miners(online):
+    store = FleetStore()
+    store.write("a", online(100_000, 3300, 80))
+    store.write("b", online(100_000, 3400, 82))
+    row = store.rows["a"]
+    store.remove("a")
+
+    assert store.values("power") == [3400]
+    store.write("c", online(100_000, 3500, 84))
+    assert store.rows["c"] == row
+    assert len(store.columns["power"]) == 2
+
+
+@pytest.mark.parametrize("backend", sorted(TOTALS_BACKENDS))
+def test_totals_skip_nan_rows(backend, online):
+    store = FleetStore()
+    for index, temperature in enumerate((70, 80, 90, 100)):
+        store.write(str(index), online(100_000, 3000, temperature))
+    store.write("offline", MinerData("M30S"))
+    store.clear("3")
+
+    totals = TOTALS_BACKENDS[backend](store)
+    assert totals.miners == 3
+    assert totals.hash_rate == pytest.approx(300)
+    assert totals.power == pytest.approx(9000)
+    assert totals.efficiency == pytest.approx(30)
+    assert totals.chip_temperature_p50 == pytest.approx(80)
+    assert totals.chip_temperature_p95 == pytest.approx(89)
+    assert totals.chip_temperature_maximum == pytest.approx(90)
+
+
+@pytest.mark.parametrize("backend", sorted(TOTALS_BACKENDS))
+def test_totals_of_a_fleet_without_summaries(backend):
+    store = FleetStore()
+    store.write("offline", MinerData("M30S"))
+
+    totals = TOTALS_BACKENDS[backend](store)
+    assert totals.miners == 0
+    assert totals.efficiency is None
+    assert totals.chip_temperature_maximum is None
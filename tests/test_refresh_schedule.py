@@ -0,0 +1,54 @@
+from datetime import timedelta
+
+from custom_components.whatsminer.coordinator import RefreshSchedule
+
+
+def _schedule() -> RefreshSchedule:
+    return RefreshSchedule(
+        {"summary": timedelta(seconds=5), "get_version": timedelta(minutes=10)},
+        tolerance=timedelta(seconds=1),
+    )
+
+
+def test_schedule_commands_never_read_are_due():
+    assert _schedule().due(0) == ["summary", "get_version"]
+
+
+def test_schedule_command_is_due_once_its_period_passed():
+    schedule = _schedule()
+    schedule.mark("summary", 100)
+    schedule.mark("get_version", 100)
+
+    assert schedule.due(103) == []
+    assert schedule.due(105) == ["summary"]
+    assert schedule.due(700) == ["summary", "get_version"]
+
+
+def test_schedule_reads_commands_due_slightly_after_the_tick():
+    schedule = _schedule()
+    schedule.mark("summary", 100)
+
+    assert "summary" in schedule.due(104)
+    assert "summary" not in schedule.due(103.9)
+
+
+def test_schedule_expired_command_is_due_until_read_again():
+    schedule = _schedule()
+    schedule.mark("get_version", 100)
+    schedule.expire("get_version")
+
+    assert "get_version" in schedule.due(101)
+    assert "get_version" in schedule.due(102)
+    # The age survives the expiry
+    assert schedule.age("get_version", 102) == 2
+
+    schedule.mark("get_version", 102)
+    assert "get_version" not in schedule.due(103)
+
+
+def test_schedule_age():
+    schedule = _schedule()
+    assert schedule.age("summary", 100) is None
+
+    schedule.mark("summary", 100)
+    assert schedule.age("summary", 112.5) == 12.5
@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+
+from custom_components.whatsminer.api import SingleFlight, WhatsminerMachine
+
+
+def test_single_flight_shares_one_call():
+    calls = []
+
+    async def fetch():
+        calls.append(None)
+        await asyncio.sleep(0.01)
+        return "reply"
+
+    async def main():
+        flight = SingleFlight()
+        return await asyncio.gather(flight.run("key", fetch), flight.run("key", fetch))
+
+    assert asyncio.run(main()) == ["reply", "reply"]
+    assert len(calls) == 1
+
+
+def test_single_flight_shares_the_exception():
+    calls = []
+
+    async def fetch():
+        calls.append(None)
+        await asyncio.sleep(0.01)
+        raise OSError("unreachable")
+
+    async def main():
+        flight = SingleFlight()
+        return await asyncio.gather(
+            flight.run("key", fetch), flight.run("key", fetch), return_exceptions=True
+        )
+
+    results = asyncio.run(main())
+    assert [type(result) for result in results] == [OSError, OSError]
+    assert len(calls) == 1
+
+
+def test_single_flight_keeps_different_keys_apart():
+    async def main():
+        flight = SingleFlight()
+
+        async def fetch(value):
+            await asyncio.sleep(0.01)
+            return value
+
+        return await asyncio.gather(
+            flight.run("a", lambda: fetch("a")), flight.run("b", lambda: fetch("b"))
+        )
+
+    assert asyncio.run(main()) == ["a", "b"]
+
+
+def test_single_flight_starts_over_once_the_call_finished():
+    calls = []
+
+    async def fetch():
+        calls.append(None)
+        return len(calls)
+
+    async def main():
+        flight = SingleFlight()
+        return [await flight.run("key", fetch), await flight.run("key", fetch)]
+
+    assert asyncio.run(main()) == [1, 2]
+
+
+def test_single_flight_cancelled_caller_does_not_abort_the_others():
+    async def main():
+        flight = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.05)
+            return "reply"
+
+        first = asyncio.ensure_future(flight.run("key", fetch))
+        second = asyncio.ensure_future(flight.run("key", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == "reply"
+
+
+def test_single_flight_cancels_the_call_once_every_caller_left():
+    started = []
+    cancelled = []
+
+    async def fetch():
+        started.append(None)
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(None)
+            raise
+        return "stale"
+
+    async def main():
+        flight = SingleFlight()
+        caller = asyncio.ensure_future(flight.run("key", fetch))
+        await asyncio.sleep(0)
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        await asyncio.sleep(0)
+
+        async def fresh():
+            return "fresh"
+
+        # The hung call was forgotten, the next caller starts its own
+        return await flight.run("key", fresh)
+
+    assert asyncio.run(main()) == "fresh"
+    assert len(started) == 1
+    assert len(cancelled) == 1
+
+
+def test_identical_reads_share_one_request(simulate):
+    async def main():
+        async with simulate() as miners:
+            machine = WhatsminerMachine(*miners.addresses[0])
+            replies = await asyncio.gather(*(machine.communicate("summary") for _ in range(3)))
+            return replies, miners.miners[0].requests
+
+    replies, requests = asyncio.run(main())
+    assert requests == {"summary": 1}
+    assert replies[0] == replies[1] == replies[2]
@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+from custom_components.whatsminer.api import (
+    SUMMARY_FIELDS,
+    WhatsminerApi,
+    WhatsminerApi20,
+    WhatsminerMachine,
+    build_summary,
+)
+
+REPLY_14 = {
+    "Elapsed": 3600, "MHS av": 101_143_512.3, "MHS 5s": 102_735_000.0,
+    "MHS 1m": 100_900_100.0, "MHS 5m": 100_499_600.0, "MHS 15m": 100_500_400.0,
+    "freq_avg": 608, "Target Freq": 608, "Target MHS": 100_000_000.0,
+    "Accepted": 1200, "Rejected": 3, "Temperature": 70.5, "Chip Temp Min": 61.2,
+    "Chip Temp Max": 88.9, "Chip Temp Avg": 75.0, "Env Temp": 25.5,
+    "Fan Speed In": 4800, "Fan Speed Out": 4830, "Power": 3400, "Power_RT": 3410,
+    "Power Mode": "Normal", "Pool Rejected%": 0.25, "Pool Stale%": 0.0,
+    "Uptime": 3660, "Security Mode": 0, "MAC": "C4:11:04:00:00:01",
+}
+REPLY_20 = {
+    **{key: value for key, value in REPLY_14.items() if key not in ("Power_RT", "MAC")},
+    "Power Rate": 33.2,
+}
+
+
+def test_build_summary_converts_the_legacy_reply():
+    summary = build_summary(SUMMARY_FIELDS, REPLY_14)
+
+    # Hash rates come in MH/s and are kept in GH/s
+    assert summary.average_hash_rate == 101_144
+    assert summary.hash_rate_5m == 100_500
+    assert summary.target_hash_rate == 100_000.0
+    assert summary.power_rate == 3410
+    assert summary.mac == "C4:11:04:00:00:01"
+    assert summary.security_mode is True
+    assert summary.chip_temperature_maximum == 88.9
+
+
+def test_build_summary_takes_fields_missing_from_the_reply_as_values():
+    summary = build_summary(
+        WhatsminerApi20._summary_fields, REPLY_20, mac="C4:11:04:00:00:02"
+    )
+
+    assert summary.power_rate == 33.2
+    assert summary.mac == "C4:11:04:00:00:02"
+    assert summary == build_summary(
+        SUMMARY_FIELDS, {**REPLY_14, "Power_RT": 33.2, "MAC": "C4:11:04:00:00:02"}
+    )
+
+
+def test_build_summary_raises_on_a_missing_key():
+    with pytest.raises(KeyError):
+        build_summary(SUMMARY_FIELDS, REPLY_20)
+
+
+@pytest.mark.parametrize(
+    ("api_version", "api_class"),
+    (("whatsminer v1.4.0", WhatsminerApi), ("2.0.5", WhatsminerApi20)),
+)
+def test_summary_of_each_api_version(simulate, api_version, api_class):
+    async def main():
+        async with simulate(api_version=api_version) as miners:
+            api = api_class(WhatsminerMachine(*miners.addresses[0]))
+            return await api.get_summary(), miners.miners[0]
+
+    summary, miner = asyncio.run(main())
+    assert summary.mac == miner.mac
+    assert summary.power == 3400
+    assert 97_000 <= summary.hash_rate_5m <= 103_000
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from custom_components.whatsminer.api import (
+    TOKEN_REFRESH_JITTER,
+    TOKEN_REFRESH_MARGIN,
+    TOKEN_RETRY_DELAY,
+    TOKEN_VALIDITY,
+    ApiPermissionDenied,
+    TokenExceeded,
+    WhatsminerMachine,
+)
+
+
+def _renewal_delay(machine: WhatsminerMachine) -> float:
+    return machine.tokens._timer.when() - asyncio.get_running_loop().time()
+
+
+def test_token_is_only_requested_when_needed(simulate):
+    async def main():
+        async with simulate() as miners:
+            machine = WhatsminerMachine(*miners.addresses[0], "admin")
+            machine.tokens.start()
+            await machine.communicate("summary")
+            before = dict(miners.miners[0].requests)
+            credentials = await asyncio.gather(*(machine.tokens.get() for _ in range(5)))
+            renewal = _renewal_delay(machine)
+            machine.tokens.stop()
+            return before, credentials, renewal, miners.miners[0].requests
+
+    before, credentials, renewal, requests = asyncio.run(main())
+    assert "get_token" not in before
+    # Concurrent callers share one request
+    assert requests["get_token"] == 1
+    assert all(other is credentials[0] for other in credentials)
+    assert (
+        TOKEN_VALIDITY - TOKEN_REFRESH_MARGIN - TOKEN_REFRESH_JITTER - 1
+        <= renewal <= TOKEN_VALIDITY - TOKEN_REFRESH_MARGIN
+    )
+
+
+def test_rejected_token_is_replaced_and_the_command_retried(simulate):
+    async def main():
+        async with simulate() as miners:
+            miner = miners.miners[0]
+            miner.mining = False
+            machine = WhatsminerMachine(*miners.addresses[0], "admin")
+            first = await machine.tokens.get()
+            # The miner restarted and forgot its tokens
+            miner._tokens.clear()
+            await machine.communicate("power_on", encrypted=True)
+            return first, await machine.tokens.get(), miner
+
+    first, second, miner = asyncio.run(main())
+    assert miner.mining
+    assert miner.requests["get_token"] == 2
+    assert miner.requests["power_on"] == 2
+    assert second.token != first.token
+
+
+def test_renewal_stops_when_the_api_is_denied(simulate):
+    async def main():
+        async with simulate() as miners:
+            machine = WhatsminerMachine(*miners.addresses[0], "admin")
+            machine.tokens.start()
+            miners.miners[0].faults.errors = {45: 1.0}
+            with pytest.raises(ApiPermissionDenied):
+                await machine.tokens.get()
+            return machine.tokens._timer
+
+    assert asyncio.run(main()) is None
+
+
+def test_renewal_backs_off_while_tokens_are_exceeded(simulate):
+    async def main():
+        async with simulate() as miners:
+            machine = WhatsminerMachine(*miners.addresses[0], "admin")
+            machine.tokens.start()
+            miners.miners[0].faults.errors = {136: 1.0}
+            delays = []
+            for _ in range(7):
+                with pytest.raises(TokenExceeded):
+                    await machine.tokens.refresh()
+                delays.append(_renewal_delay(machine))
+            miners.miners[0].faults.errors = {}
+            await machine.tokens.refresh()
+            delays.append(_renewal_delay(machine))
+            machine.tokens.stop()
+            return delays
+
+    delays = asyncio.run(main())
+    expected = [TOKEN_RETRY_DELAY * 2 ** failures for failures in range(5)]
+    assert delays[:5] == pytest.approx(expected, abs=1)
+    assert delays[5:7] == pytest.approx([TOKEN_VALIDITY] * 2, abs=1)
+    assert delays[7] > TOKEN_VALIDITY - TOKEN_REFRESH_MARGIN - TOKEN_REFRESH_JITTER - 1
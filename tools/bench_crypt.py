@@ -0,0 +1,77 @@
+"""
+Microbenchmark of the md5-crypt backends used for the token derivation
+
+    python tools/bench_crypt.py [--rounds 200] [--json]
+
+Compares every backend in MD5_CRYPT_BACKENDS plus the pure Python passlib
+implementation, and a full token derivation without and with the key of an
+earlier token.
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from passlib.hash import md5_crypt  # noqa: E402
+
+from custom_components.whatsminer import api  # noqa: E402
+
+PASSWORD = "admin"
+TOKEN_INFO = {"salt": "BQ5hoXV9", "newsalt": "YnVhcmVh", "time": "1648"}
+
+
+def _pure_python(word: str, salt: str) -> str:
+    previous = md5_crypt.get_backend()
+    md5_crypt.set_backend("builtin")
+    try:
+        return md5_crypt.hash(word, salt=salt)
+    finally:
+        md5_crypt.set_backend(previous)
+
+
+def _per_call(function, rounds: int) -> float:
+    return min(timeit.repeat(function, number=rounds, repeat=5)) / rounds
+
+
+def run(rounds: int) -> dict:
+    backends = dict(api.MD5_CRYPT_BACKENDS)
+    backends["passlib-builtin"] = _pure_python
+
+    results = {}
+    for name, backend in backends.items():
+        results[f"md5_crypt[{name}]"] = _per_call(
+            lambda: backend(PASSWORD, TOKEN_INFO["salt"]), rounds
+        )
+
+    previous = api._derive_credentials(PASSWORD, TOKEN_INFO, 0.0)
+
+    def cold():
+        api._derive_credentials(PASSWORD, TOKEN_INFO, 0.0)
+
+    def warm():
+        api._derive_credentials(PASSWORD, TOKEN_INFO, 0.0, previous)
+
+    results["derive_credentials[cold]"] = _per_call(cold, rounds)
+    results["derive_credentials[warm]"] = _per_call(warm, rounds)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.rounds)
+    if args.json:
+        print(json.dumps({name: seconds * 1e6 for name, seconds in results.items()}))
+        return
+    for name, seconds in results.items():
+        print(f"{name:<30} {seconds * 1e6:>10.1f} us")
+
+
+if __name__ == "__main__":
+    main()
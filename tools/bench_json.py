@@ -0,0 +1,123 @@
+"""
+Microbenchmark of the response decoding
+
+    python tools/bench_json.py [--rounds 2000] [--json]
+
+Decodes summary and devs replies captured from an M30S (API 2.0.5) and a
+summary of an older firmware with trailing commas, with the former decoding
+(str decode, strip, comma fix-up and json.loads) and with _decode_response on
+every backend in JSON_BACKENDS.
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from custom_components.whatsminer import api  # noqa: E402
+
+SUMMARY = (
+    b'{"STATUS":[{"STATUS":"S","Msg":"Summary"}],"SUMMARY":[{"Elapsed":412355,'
+    b'"MHS av":86203214.35,"MHS 5s":86920120.57,"MHS 1m":85822519.48,'
+    b'"MHS 5m":86177006.62,"MHS 15m":86237811.03,"HS RT":86177006.62,'
+    b'"Accepted":18735,"Rejected":11,"Total MH":35544872611452.0000,'
+    b'"Temperature":72.00,"freq_avg":611,"Fan Speed In":4890,"Fan Speed Out":4920,'
+    b'"Power":3372,"Power Rate":39.12,"Pool Rejected%":0.0584,"Pool Stale%":0.0000,'
+    b'"Last getwork":1681732542,"Uptime":413090,"Security Mode":0,'
+    b'"Hash Stable":true,"Hash Stable Cost Seconds":1337,"Hash Deviation%":0.0424,'
+    b'"Target Freq":596,"Target MHS":83969280,"Env Temp":27.00,'
+    b'"Power Mode":"Normal","Factory GHS":86151,"Power Limit":3600,'
+    b'"Chip Temp Min":61.50,"Chip Temp Max":86.38,"Chip Temp Avg":74.29,'
+    b'"Debug":"-0.0_100.0_360","Btminer Fast Boot":"disable"}],'
+    b'"id":1}\n'
+)
+
+SUMMARY_TRAILING_COMMA = (
+    b'{"STATUS":[{"STATUS":"S","When":1681732542,"Code":131,"Msg":"Summary",'
+    b'"Description":"btminer",}],"SUMMARY":[{"Elapsed":8312,"MHS av":68119375.27,'
+    b'"MHS 5s":68735241.17,"MHS 1m":68208712.21,"MHS 5m":68144321.05,'
+    b'"MHS 15m":68120955.61,"Accepted":388,"Rejected":1,"Temperature":70.50,'
+    b'"freq_avg":578,"Fan Speed In":5250,"Fan Speed Out":5280,"Power":3354,'
+    b'"Power_RT":3354,"Pool Rejected%":0.2571,"Pool Stale%":0.0000,"Uptime":8410,'
+    b'"Security Mode":0,"Target Freq":578,"Target MHS":68123904,"Env Temp":26.00,'
+    b'"Power Mode":"Normal","Chip Temp Min":58.12,"Chip Temp Max":83.50,'
+    b'"Chip Temp Avg":71.94,"MAC":"C4:11:0B:2A:19:E7",}],"id":1}\n'
+)
+
+
+def _board(slot: int) -> bytes:
+    return (
+        b'{"ASC":%d,"Slot":%d,"Enabled":"Y","Status":"Alive","Temperature":71.50,'
+        b'"Chip Frequency":611,"Fan Speed In":4890,"Fan Speed Out":4920,'
+        b'"MHS av":28734404.78,"MHS 5s":28973373.52,"MHS 1m":28607506.49,'
+        b'"MHS 5m":28725668.87,"MHS 15m":28745937.01,"Accepted":6245,"Rejected":4,'
+        b'"Hardware Errors":0,"Utility":0.91,"Last Share Pool":1,'
+        b'"Last Share Time":1681732540,"Total MH":11848290870484.0000,'
+        b'"Diff1 Work":0,"Difficulty Accepted":342736896.00000000,'
+        b'"Difficulty Rejected":219520.00000000,"Last Share Difficulty":65536.00000000,'
+        b'"Last Valid Work":1681732540,"Device Hardware%%":0.0000,'
+        b'"Device Rejected%%":0.0640,"Device Elapsed":412355,"Upfreq Complete":1,'
+        b'"Effective Chips":148,"PCB SN":"HEM1EPFD21031812%02d",'
+        b'"Chip Data":"K88Z000-2120 BINV03-195022D",'
+        b'"Chip Temp Min":61.50,"Chip Temp Max":86.38,"Chip Temp Avg":74.29,'
+        b'"chip_vol_diff":12}' % (slot, slot, slot)
+    )
+
+
+DEVS = (
+    b'{"STATUS":[{"STATUS":"S","Msg":"3 ASC(s)"}],"DEVS":['
+    + b",".join(_board(slot) for slot in range(3))
+    + b'],"id":1}\n'
+)
+
+PAYLOADS = {
+    "summary": SUMMARY,
+    "devs": DEVS,
+    "summary[trailing comma]": SUMMARY_TRAILING_COMMA,
+}
+
+
+def _former(payload: bytes):
+    return json.loads(payload.decode("utf-8").strip().replace(",}", "}"))
+
+
+def _per_call(function, rounds: int) -> float:
+    return min(timeit.repeat(function, number=rounds, repeat=5)) / rounds
+
+
+def run(rounds: int) -> dict:
+    results = {}
+    default = api._json_loads
+    try:
+        for name, payload in PAYLOADS.items():
+            expected = _former(payload)
+            results[f"{name}[former]"] = _per_call(lambda: _former(payload), rounds)
+            for backend, loads in api.JSON_BACKENDS.items():
+                api._json_loads = loads
+                assert api._decode_response(payload) == expected
+                results[f"{name}[{backend}]"] = _per_call(
+                    lambda: api._decode_response(payload), rounds
+                )
+    finally:
+        api._json_loads = default
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=2000)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.rounds)
+    if args.json:
+        print(json.dumps({name: seconds * 1e6 for name, seconds in results.items()}))
+        return
+    for name, seconds in results.items():
+        print(f"{name:<34} {seconds * 1e6:>10.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+"""
+Benchmark of the polling hot path against simulated miners
+
+    python tools/bench_polling.py --sizes 1,10,100,1000 --output results.json
+    python tools/bench_polling.py --baseline results.json --tolerance 0.25
+
+For every fleet size, simulated miners are started in a subprocess (see
+simulator.py) so that CPU time is measured for the polling side only. Each mode
+then polls the whole fleet for a number of cycles:
+
+    serial      status, summary and PSU awaited one after another per miner,
+                every miner concurrently, like the original async_fetch
+    concurrent  WhatsminerApi.read with joined commands disabled
+    batched     WhatsminerApi.read with joined commands
+    fleet       WhatsminerFleetCoordinator.async_fetch once per cycle, driving
+                one WhatsminerCoordinator per miner with the shared connection
+                limit, then writing the fleet store and computing the totals.
+                Status, summary and PSU are forced due every cycle so all modes
+                do the same work, with --steady-state only what the refresh
+                schedule finds due is read
+
+Reported per mode and size: per miner poll latency percentiles, polls per
+second, CPU time per poll, peak open sockets and resident memory. The cycle
+time of the fleet mode includes the fleet wide work after the polls. With
+--baseline, the run fails when any poll failed, or when latency or CPU per poll
+regressed by more than --tolerance against an earlier --output file.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+# A cycle polls every miner once and returns the poll latencies in s and the
+# number of failed polls
+Cycle = Callable[[], Awaitable[Tuple[List[float], int]]]
+
+TOOLS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TOOLS))
+
+from custom_components.whatsminer import api  # noqa: E402
+
+MODES = ("serial", "concurrent", "batched", "fleet")
+COMMANDS = ("status", "summary", "get_psu")
+PASSWORD = "admin"
+
+
+def _open_sockets() -> int:
+    count = 0
+    for fd in os.listdir("/proc/self/fd"):
+        try:
+            if os.readlink(f"/proc/self/fd/{fd}").startswith("socket:"):
+                count += 1
+        except OSError:
+            pass
+    return count
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))]
+
+
+class SocketSampler(object):
+    """Samples the number of open sockets while a cycle runs."""
+
+    def __init__(self, period: float = 0.005):
+        self._period = period
+        self.peak = 0
+        self._task = None
+
+    async def _sample(self):
+        while True:
+            self.peak = max(self.peak, _open_sockets())
+            await asyncio.sleep(self._period)
+
+    def __enter__(self):
+        self._task = asyncio.ensure_future(self._sample())
+        return self
+
+    def __exit__(self, *exc_info):
+        self._task.cancel()
+
+
+async def _serial_poll(miner: api.WhatsminerApi):
+    await miner.get_status()
+    await miner.get_summary()
+    await miner.get_psu()
+
+
+async def _read_poll(miner: api.WhatsminerApi):
+    readings = await miner.read(*COMMANDS)
+    for reading in readings.values():
+        if isinstance(reading, BaseException):
+            raise reading
+
+
+def _api_cycle(mode: str, addresses) -> Cycle:
+    pollers = []
+    for host, port in addresses:
+        machine = api.WhatsminerMachine(host, port, PASSWORD)
+        if mode == "concurrent":
+            machine._batch_supported = False
+        miner = api.WhatsminerApi20(machine, mac="00:00:00:00:00:00")
+        poll = _serial_poll if mode == "serial" else _read_poll
+        pollers.append(lambda miner=miner, poll=poll: poll(miner))
+
+    async def cycle() -> Tuple[List[float], int]:
+        latencies: List[float] = []
+        failures = 0
+
+        async def timed(poll):
+            nonlocal failures
+            started = time.perf_counter()
+            try:
+                await poll()
+            except BaseException:  # noqa: B036 - WhatsminerException is a BaseException
+                failures += 1
+            latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(timed(poll) for poll in pollers))
+        return latencies, failures
+
+    return cycle
+
+
+async def _fleet(addresses, max_connections: int):
+    from homeassistant.config_entries import ConfigEntry
+    from homeassistant.core import HomeAssistant
+
+    from custom_components.whatsminer.const import (
+        DOMAIN, CONF_HOST, CONF_PORT, CONF_PASSWORD, CONF_MAC, CONF_FLEET_MODE
+    )
+    from custom_components.whatsminer.coordinator import WhatsminerCoordinator
+    from custom_components.whatsminer.fleet import WhatsminerFleetCoordinator
+
+    hass = HomeAssistant(tempfile.mkdtemp())
+    # The bare hass has no registries or config entries, so storing what the
+    # members detected fails, once per member and outside the measured polls
+    logging.getLogger("custom_components.whatsminer.coordinator").setLevel(logging.ERROR)
+    fleet = WhatsminerFleetCoordinator(hass, max_connections)
+    for index, (host, port) in enumerate(addresses):
+        entry = ConfigEntry(
+            version=2,
+            domain=DOMAIN,
+            title="Whatsminer",
+            data={
+                CONF_HOST: host, CONF_PORT: port, CONF_PASSWORD: PASSWORD,
+                CONF_MAC: f"00:00:00:00:{index >> 8 & 0xFF:02x}:{index & 0xFF:02x}",
+            },
+            source="user",
+            options={CONF_FLEET_MODE: True},
+        )
+        fleet.members[entry.entry_id] = WhatsminerCoordinator(hass, entry, fleet)
+    return fleet
+
+
+def _fleet_cycle(fleet, steady_state: bool) -> Cycle:
+    latencies: List[float] = []
+
+    def timed(member):
+        fetch = member.async_fetch
+
+        # The fleet calls async_fetch of every member, each is timed inside it
+        async def timed_fetch():
+            if not steady_state:
+                member.schedule.expire(*COMMANDS)
+            started = time.perf_counter()
+            try:
+                return await fetch()
+            finally:
+                latencies.append(time.perf_counter() - started)
+
+        member.async_fetch = timed_fetch
+
+    for member in fleet.members.values():
+        timed(member)
+
+    async def cycle() -> Tuple[List[float], int]:
+        latencies.clear()
+        await fleet.async_fetch()
+        return list(latencies), len(fleet.errors)
+
+    return cycle
+
+
+async def _run_cycles(
+        cycle: Cycle, cycles: int, interval: float
+) -> Tuple[List[float], List[float], int]:
+    latencies: List[float] = []
+    cycle_times: List[float] = []
+    failures = 0
+
+    for index in range(cycles + 1):
+        if index == 1:
+            # The first cycle detects APIs, fetches identities and warms caches
+            latencies.clear()
+            cycle_times.clear()
+            failures = 0
+        started = time.perf_counter()
+        cycle_latencies, cycle_failures = await cycle()
+        cycle_times.append(time.perf_counter() - started)
+        latencies.extend(cycle_latencies)
+        failures += cycle_failures
+        if interval:
+            await asyncio.sleep(interval)
+    return latencies, cycle_times, failures
+
+
+async def bench(mode: str, addresses, args) -> Dict:
+    cycles = args.cycles
+    if mode == "fleet":
+        fleet = await _fleet(addresses, args.max_connections)
+        cycle = _fleet_cycle(fleet, args.steady_state)
+    else:
+        cycle = _api_cycle(mode, addresses)
+
+    cpu_started = time.process_time()
+    with SocketSampler() as sockets:
+        latencies, cycle_times, failures = await _run_cycles(cycle, cycles, args.interval)
+    cpu = time.process_time() - cpu_started
+    polls = len(addresses) * (cycles + 1)
+
+    return {
+        "mode": mode,
+        "miners": len(addresses),
+        "cycles": cycles,
+        "latency_p50_ms": _percentile(latencies, 50) * 1000,
+        "latency_p95_ms": _percentile(latencies, 95) * 1000,
+        "latency_p99_ms": _percentile(latencies, 99) * 1000,
+        "cycle_mean_ms": statistics.mean(cycle_times) * 1000,
+        "polls_per_second": len(latencies) / sum(cycle_times),
+        "cpu_per_poll_ms": cpu / polls * 1000,
+        "peak_sockets": sockets.peak,
+        "rss_mb": _rss_mb(),
+        "failures": failures,
+    }
+
+
+def _start_simulator(size: int, args) -> Tuple[subprocess.Popen, List[Tuple[str, int]]]:
+    addresses_file = tempfile.NamedTemporaryFile(suffix=".json", delete=False).name
+    os.unlink(addresses_file)
+    command = [
+        sys.executable, os.path.join(TOOLS, "simulator.py"),
+        "--miners", str(size), "--addresses", addresses_file,
+        "--latency", str(args.latency), "--base-port", str(args.base_port),
+    ]
+    if args.loopback:
+        command.append("--loopback")
+    process = subprocess.Popen(command, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while not os.path.exists(addresses_file) or not os.path.getsize(addresses_file):
+        if process.poll() is not None or time.monotonic() > deadline:
+            raise RuntimeError("Simulator did not start")
+        time.sleep(0.1)
+    time.sleep(0.1)
+    with open(addresses_file) as addresses:
+        result = [(address["host"], address["port"]) for address in json.load(addresses)]
+    os.unlink(addresses_file)
+    return process, result
+
+
+def _compare(results: List[Dict], baseline_file: str, tolerance: float) -> List[str]:
+    with open(baseline_file) as baseline:
+        previous = {(row["mode"], row["miners"]): row for row in json.load(baseline)}
+    regressions = []
+    for row in results:
+        # Failed polls return early and would otherwise look like a speedup
+        if row["failures"]:
+            regressions.append(f"{row['mode']}/{row['miners']} failures: {row['failures']}")
+        before = previous.get((row["mode"], row["miners"]))
+        if before is None:
+            continue
+        for metric in ("latency_p95_ms", "cpu_per_poll_ms"):
+            if row[metric] > before[metric] * (1 + tolerance):
+                regressions.append(
+                    f"{row['mode']}/{row['miners']} {metric}: "
+                    f"{before[metric]:.2f} -> {row[metric]:.2f}"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1,10,100,1000")
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--cycles", type=int, default=5)
+    parser.add_argument("--interval", type=float, default=0.0,
+                        help="pause between cycles in s")
+    parser.add_argument("--steady-state", action="store_true",
+                        help="fleet mode reads only the commands its schedule finds due")
+    parser.add_argument("--latency", type=float, default=0.005,
+                        help="simulated reply delay of the miners in s")
+    parser.add_argument("--max-connections", type=int, default=32,
+                        help="connection limit of the fleet mode")
+    parser.add_argument("--base-port", type=int, default=24028)
+    parser.add_argument("--loopback", action="store_true",
+                        help="give every simulated miner its own 127.x.y.z address")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against an earlier --output file")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = []
+    for size in (int(size) for size in args.sizes.split(",")):
+        process, addresses = _start_simulator(size, args)
+        try:
+            for mode in args.modes.split(","):
+                row = asyncio.run(bench(mode, addresses, args))
+                results.append(row)
+                print(
+                    f"{mode:<11} {size:>5} miners  p50 {row['latency_p50_ms']:8.2f} ms  "
+                    f"p95 {row['latency_p95_ms']:8.2f} ms  {row['polls_per_second']:9.1f} polls/s  "
+                    f"cpu {row['cpu_per_poll_ms']:6.3f} ms/poll  sockets {row['peak_sockets']:5d}  "
+                    f"rss {row['rss_mb']:6.1f} MB  failures {row['failures']}",
+                    flush=True,
+                )
+        finally:
+            process.terminate()
+            process.wait()
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+    if args.baseline:
+        regressions = _compare(results, args.baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
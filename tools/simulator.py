@@ -0,0 +1,404 @@
+"""
+Simulated Whatsminer miners for testing and load generation
+
+    python tools/simulator.py --miners 1000 --base-port 14028 --api 2.0.5
+    python tools/simulator.py --miners 2000 --loopback --latency 0.05 --drop 0.01 --error 136:0.001
+
+Every virtual miner listens on its own port of 127.0.0.1, or with --loopback on
+port 4028 of its own 127.x.y.z address (Linux routes all of 127.0.0.0/8 to lo).
+They implement the v1.4.0 and v2.0.x commands used by the integration, including
+joined cgminer style reads, the get_token salt/newsalt handshake and AES-ECB
+encrypted commands. Latency, dropped connections and error codes (14, 23, 45,
+135, 136, ...) can be injected.
+
+Only passlib and pycryptodome are needed, Home Assistant is not imported.
+"""
+import argparse
+import asyncio
+import base64
+import binascii
+import dataclasses
+import hashlib
+import json
+import logging
+import random
+import resource
+import string
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+from Crypto.Cipher import AES
+from passlib.hash import md5_crypt
+
+_LOGGER = logging.getLogger("whatsminer.simulator")
+
+TOKEN_VALIDITY = 30 * 60
+TOKEN_LIMIT = 32
+
+# Served by btminer itself, unavailable while it is powered off
+CGMINER_COMMANDS = ("summary", "devdetails")
+WRITE_COMMANDS = (
+    "power_on",
+    "power_off",
+    "restart_btminer",
+    "reboot",
+    "set_lower_power",
+    "set_low_power",
+    "set_normal_power",
+    "set_high_power",
+    "set_target_freq",
+    "set_power_pct",
+    "enable_cgminer_fast_boot",
+    "disable_cgminer_fast_boot",
+)
+
+
+@dataclasses.dataclass
+class Faults(object):
+    latency: float = 0.0
+    jitter: float = 0.0
+    drop: float = 0.0
+    # Error code -> probability of answering any command with it
+    errors: Dict[int, float] = dataclasses.field(default_factory=dict)
+    # Reply "...,}" like some firmware does
+    trailing_comma: bool = False
+    # Reject joined commands such as "summary+devdetails"
+    no_batch: bool = False
+
+
+def _salt(length: int = 8) -> str:
+    return "".join(random.choices(string.ascii_letters + string.digits, k=length))
+
+
+def _cipher(key: str):
+    return AES.new(
+        binascii.unhexlify(hashlib.sha256(key.encode()).hexdigest().encode()), AES.MODE_ECB
+    )
+
+
+def _pad(data: bytes) -> bytes:
+    return data + b"\0" * (-len(data) % 16)
+
+
+class VirtualMiner(object):
+    def __init__(
+            self,
+            index: int,
+            api_version: str = "2.0.5",
+            password: str = "admin",
+            faults: Optional[Faults] = None,
+    ):
+        self.index = index
+        self.api_version = api_version
+        self.password = password
+        self.faults = faults or Faults()
+        self.mac = "C4:11:{:02X}:{:02X}:{:02X}:{:02X}".format(
+            0x10, (index >> 16) & 0xFF, (index >> 8) & 0xFF, index & 0xFF
+        )
+        self.mining = True
+        self.power_percent = 100
+        self.started = time.monotonic()
+        self.accepted = 0
+        self.rejected = 0
+        self.requests: Dict[str, int] = {}
+
+        self._salt = _salt()
+        self._key = md5_crypt.hash(password, salt=self._salt).split("$")[3]
+        self._aes = _cipher(self._key)
+        self._tokens: List[Tuple[str, float]] = []
+
+    @property
+    def legacy(self) -> bool:
+        return self.api_version == "whatsminer v1.4.0"
+
+    # ----------------------------------------------------------------- protocol
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await self._read_request(reader)
+            if request is None:
+                return
+            faults = self.faults
+            if faults.latency or faults.jitter:
+                await asyncio.sleep(max(0.0, random.gauss(faults.latency, faults.jitter)))
+            if faults.drop and random.random() < faults.drop:
+                return
+            response = self.respond(request)
+            reply = response if isinstance(response, str) else json.dumps(response)
+            if faults.trailing_comma and reply.endswith("}"):
+                reply = reply[:-1] + ",}"
+            writer.write(reply.encode() + b"\n")
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader: asyncio.StreamReader) -> Optional[Dict]:
+        # Clients do not terminate requests, read until a complete JSON document
+        data = b""
+        while True:
+            chunk = await reader.read(65536)
+            if not chunk:
+                return None
+            data += chunk
+            try:
+                return json.loads(data)
+            except ValueError:
+                continue
+
+    def respond(self, request: Dict) -> Union[Dict, str]:
+        if request.get("enc") == 1:
+            return self._respond_encrypted(request)
+
+        command = request.get("cmd") or request.get("command") or ""
+        self.requests[command] = self.requests.get(command, 0) + 1
+        injected = self._injected_error()
+        if injected is not None:
+            return _error(injected)
+        if not self.mining and any(part in CGMINER_COMMANDS for part in command.split("+")):
+            # The API daemon cannot reach btminer while it is powered off
+            return "Socket connect failed: Connection refused"
+        if "+" in command:
+            if self.faults.no_batch:
+                return _error(14)
+            return {part: [self._read(part, request)] for part in command.split("+")}
+        if command == "get_token":
+            return self._issue_token()
+        if command in WRITE_COMMANDS:
+            return _error(45)
+        return self._read(command, request)
+
+    def _injected_error(self) -> Optional[int]:
+        for code, probability in self.faults.errors.items():
+            if random.random() < probability:
+                return code
+        return None
+
+    def _issue_token(self) -> Dict:
+        now = time.monotonic()
+        self._tokens = [(token, issued) for token, issued in self._tokens
+                        if now - issued < TOKEN_VALIDITY]
+        if len(self._tokens) >= TOKEN_LIMIT:
+            return _error(136)
+        token_time = str(int(time.time()) % 10000)
+        new_salt = _salt()
+        token = md5_crypt.hash(self._key + token_time, salt=new_salt).split("$")[3]
+        self._tokens.append((token, now))
+        return _ok({"time": token_time, "salt": self._salt, "newsalt": new_salt})
+
+    def _respond_encrypted(self, request: Dict) -> Dict:
+        try:
+            plaintext = self._aes.decrypt(base64.b64decode(request["data"]))
+            message = json.loads(plaintext.rstrip(b"\0").decode())
+        except (KeyError, ValueError, binascii.Error):
+            return _error(23)
+        command = message.get("cmd", "")
+        self.requests[command] = self.requests.get(command, 0) + 1
+
+        now = time.monotonic()
+        injected = self._injected_error()
+        if injected is not None:
+            reply = _error(injected)
+        elif not any(token == message.get("token") and now - issued < TOKEN_VALIDITY
+                     for token, issued in self._tokens):
+            reply = _error(135)
+        elif command not in WRITE_COMMANDS:
+            reply = _error(14)
+        else:
+            reply = self._write(command, message)
+        encrypted = self._aes.encrypt(_pad(json.dumps(reply).encode()))
+        return {"enc": base64.b64encode(encrypted).decode()}
+
+    # ------------------------------------------------------------------- state
+    def _write(self, command: str, message: Dict) -> Dict:
+        if command == "power_off":
+            self.mining = False
+        elif command == "power_on":
+            self.mining = True
+        elif command in ("restart_btminer", "reboot"):
+            self.started = time.monotonic()
+            self.mining = True
+        elif command == "set_power_pct":
+            self.power_percent = int(message.get("percent", 100))
+        return _ok("")
+
+    def _read(self, command: str, request: Dict) -> Dict:
+        if command == "summary":
+            return {
+                "STATUS": [{"STATUS": "S", "Msg": "Summary"}],
+                "SUMMARY": [self._summary()],
+            }
+        if command == "status":
+            key = "Firmware Version" if self.legacy else "FirmwareVersion"
+            return _ok({
+                "btmineroff": "false" if self.mining else "true",
+                key: "'20220513.22.REL'",
+            })
+        if command == "get_version":
+            return _ok({"api_ver": self.api_version, "fw_ver": "20220513.22.REL"})
+        if command == "get_psu":
+            return _ok({
+                "name": "P221B", "hw_version": "V01.00", "sw_version": "V01.00.V01.03",
+                "model": "P221B", "iin": "8000", "vin": "22400", "fan_speed": "6800",
+                "version": "1", "serial_no": f"PSU{self.index:08d}",
+            })
+        if command == "devdetails":
+            return {
+                "STATUS": [{"STATUS": "S", "Msg": "Device Details"}],
+                "DEVDETAILS": [
+                    {"DEVDETAILS": board, "Name": "SM", "ID": board, "Driver": "bitmicro",
+                     "Kernel": "", "Model": "M30S+.VE40"}
+                    for board in range(3)
+                ],
+            }
+        if command == "get_miner_info":
+            info = {
+                "ip": "127.0.0.1", "proto": "dhcp", "netmask": "255.0.0.0",
+                "gateway": "127.0.0.1", "dns": "127.0.0.1",
+                "hostname": f"WhatsMiner{self.index}", "mac": self.mac,
+            }
+            fields = str(request.get("info", "")).split(",")
+            return _ok({field: info[field] for field in fields if field in info})
+        return _error(14)
+
+    def _summary(self) -> Dict:
+        uptime = int(time.monotonic() - self.started)
+        self.accepted += random.randint(0, 2)
+        self.rejected += random.random() < 0.01
+        target = 100_000_000 * self.power_percent / 100
+        hash_rate = lambda: target * random.uniform(0.97, 1.03)  # noqa: E731
+        summary = {
+            "Elapsed": uptime, "MHS av": hash_rate(), "MHS 5s": hash_rate(),
+            "MHS 1m": hash_rate(), "MHS 5m": hash_rate(), "MHS 15m": hash_rate(),
+            "Accepted": self.accepted, "Rejected": self.rejected,
+            "Temperature": round(random.uniform(65, 75), 2), "freq_avg": 608,
+            "Fan Speed In": 4800, "Fan Speed Out": 4830,
+            "Power": int(3400 * self.power_percent / 100), "Pool Rejected%": 0.01,
+            "Pool Stale%": 0.0, "Uptime": uptime + 60, "Security Mode": 0,
+            "Target Freq": 608, "Target MHS": target, "Env Temp": 25.5,
+            "Power Mode": "Normal", "Chip Temp Min": round(random.uniform(60, 65), 2),
+            "Chip Temp Max": round(random.uniform(80, 90), 2),
+            "Chip Temp Avg": round(random.uniform(70, 78), 2),
+        }
+        if self.legacy:
+            summary["Power_RT"] = summary["Power"]
+            summary["MAC"] = self.mac
+        else:
+            summary["Power Rate"] = 33.2
+        return summary
+
+
+def _ok(message) -> Dict:
+    return {"STATUS": "S", "When": int(time.time()), "Code": 131, "Msg": message,
+            "Description": ""}
+
+
+def _error(code: int) -> Dict:
+    return {"STATUS": "E", "When": int(time.time()), "Code": code,
+            "Msg": "simulated error", "Description": ""}
+
+
+class Simulator(object):
+    """Runs many virtual miners in the current event loop."""
+
+    def __init__(self):
+        self.miners: List[VirtualMiner] = []
+        self.addresses: List[Tuple[str, int]] = []
+        self._servers: List[asyncio.AbstractServer] = []
+
+    async def start(
+            self,
+            count: int,
+            api_version: str = "2.0.5",
+            password: str = "admin",
+            faults: Optional[Faults] = None,
+            base_port: int = 14028,
+            loopback: bool = False,
+    ) -> List[Tuple[str, int]]:
+        _raise_open_files_limit()
+        for index in range(len(self.miners), len(self.miners) + count):
+            miner = VirtualMiner(index, api_version, password, faults)
+            if loopback:
+                subnet, host_id = divmod(index, 254)
+                host, port = f"127.{subnet >> 8}.{subnet & 0xFF}.{host_id + 1}", 4028
+            else:
+                host, port = "127.0.0.1", base_port + index
+            server = await asyncio.start_server(miner.handle, host, port, backlog=64)
+            self.miners.append(miner)
+            self.addresses.append((host, port))
+            self._servers.append(server)
+        return self.addresses[-count:]
+
+    async def stop(self):
+        for server in self._servers:
+            server.close()
+        await asyncio.gather(*(server.wait_closed() for server in self._servers))
+        self._servers.clear()
+
+
+def _raise_open_files_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def _parse_error(value: str) -> Tuple[int, float]:
+    code, _, probability = value.partition(":")
+    return int(code), float(probability or 1.0)
+
+
+async def _serve(args):
+    faults = Faults(
+        latency=args.latency,
+        jitter=args.jitter,
+        drop=args.drop,
+        errors=dict(args.error),
+        trailing_comma=args.trailing_comma,
+        no_batch=args.no_batch,
+    )
+    simulator = Simulator()
+    addresses = await simulator.start(
+        args.miners, args.api, args.password, faults, args.base_port, args.loopback
+    )
+    _LOGGER.info("Serving %d miners from %s:%d to %s:%d", len(addresses), *addresses[0],
+                 *addresses[-1])
+    if args.addresses:
+        with open(args.addresses, "w") as output:
+            json.dump([{"host": host, "port": port} for host, port in addresses], output)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await simulator.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--miners", type=int, default=1)
+    parser.add_argument("--api", default="2.0.5",
+                        help='API version, "whatsminer v1.4.0" or "2.0.x"')
+    parser.add_argument("--password", default="admin")
+    parser.add_argument("--base-port", type=int, default=14028)
+    parser.add_argument("--loopback", action="store_true",
+                        help="give every miner its own 127.x.y.z address on port 4028")
+    parser.add_argument("--latency", type=float, default=0.0, help="mean reply delay in s")
+    parser.add_argument("--jitter", type=float, default=0.0, help="reply delay deviation in s")
+    parser.add_argument("--drop", type=float, default=0.0,
+                        help="probability of closing a connection without reply")
+    parser.add_argument("--error", type=_parse_error, action="append", default=[],
+                        metavar="CODE:PROBABILITY", help="inject an error code, repeatable")
+    parser.add_argument("--trailing-comma", action="store_true")
+    parser.add_argument("--no-batch", action="store_true",
+                        help="reject joined commands like summary+devdetails")
+    parser.add_argument("--addresses", help="write the miner addresses to this JSON file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()